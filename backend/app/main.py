@@ -1,11 +1,14 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from database.db import engine
 from models import models
 from routes import authentication, caretakers, owners, administrator
+from utils import location_sync, token
 
-
-app = FastAPI()
+# orjson renders every JSON response, including the ones built from response_model
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # CORS configuration
 app.add_middleware(
@@ -14,10 +17,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor", "ETag"],  # Pagination, conditional GETs
 )
 
 models.Base.metadata.create_all(engine)
 
+
+@app.on_event("startup")
+async def start_revoked_token_sync():
+    app.state.revoked_token_sync = asyncio.create_task(
+        token.sync_revoked_tokens_forever()
+    )
+
+
+@app.on_event("startup")
+async def start_caretaker_location_sync():
+    app.state.caretaker_location_sync = asyncio.create_task(
+        location_sync.sync_caretaker_locations_forever()
+    )
+
+
+@app.on_event("shutdown")
+async def stop_revoked_token_sync():
+    app.state.revoked_token_sync.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_caretaker_location_sync():
+    app.state.caretaker_location_sync.cancel()
+
+
 app.include_router(administrator.router, tags=["admin"], prefix="/api/v1/admin")
 app.include_router(
     authentication.router, tags=["authentication"], prefix="/api/v1/authentication"
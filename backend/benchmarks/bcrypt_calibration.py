@@ -0,0 +1,30 @@
+"""
+Print the bcrypt cost to configure as BCRYPT_ROUNDS on this host
+
+Times password verification with utils.hashing.calibrate_bcrypt_rounds (the
+median of several verifies) and prints the cost closest to TARGET_VERIFY_MS.
+Run it once on the deployment hardware and put the result in the .env file;
+the app itself never calibrates at startup. An optional argument overrides the
+target in milliseconds.
+
+Run from the backend directory with the usual .env settings:
+    python -m benchmarks.bcrypt_calibration [target_ms]
+"""
+
+import sys
+from utils import hashing
+
+TARGET_VERIFY_MS = 250
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+SAMPLES = 7
+
+
+def main():
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else TARGET_VERIFY_MS
+    rounds = hashing.calibrate_bcrypt_rounds(target_ms, MIN_ROUNDS, MAX_ROUNDS, SAMPLES)
+    print(f"BCRYPT_ROUNDS={rounds}  (target {target_ms:g} ms verify)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the scalar and vectorized caretaker distance computations
+
+Run from the backend directory:
+    python -m benchmarks.distance_benchmark
+"""
+
+import heapq
+import random
+import timeit
+from utils import recommendation
+
+CARETAKERS = 50_000
+OWNERS = 200
+K = 5
+REPEAT = 5
+
+
+def scalar_top_k(points, lat, lon, distance_fn):
+    return heapq.nsmallest(
+        K, ((distance_fn(lat, lon, p_lat, p_lon), key) for key, p_lat, p_lon in points)
+    )
+
+
+def main():
+    random.seed(0)
+    points = [
+        (str(i), random.uniform(-90, 90), random.uniform(-180, 180))
+        for i in range(CARETAKERS)
+    ]
+    owners = [
+        (random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(OWNERS)
+    ]
+    owner_lats = [lat for lat, _ in owners]
+    owner_lons = [lon for _, lon in owners]
+
+    for metric, distance_fn in (
+        ("euclidean", recommendation.compute_distance),
+        ("haversine", recommendation.compute_haversine_distance),
+    ):
+        engine = recommendation.DistanceEngine(metric)
+        engine.load(points)
+        lat, lon = owners[0]
+
+        scalar = min(
+            timeit.repeat(
+                lambda: scalar_top_k(points, lat, lon, distance_fn),
+                number=1,
+                repeat=REPEAT,
+            )
+        )
+        vector = min(
+            timeit.repeat(lambda: engine.top_k(lat, lon, K), number=1, repeat=REPEAT)
+        )
+        batch = min(
+            timeit.repeat(
+                lambda: engine.batch_top_k(owner_lats, owner_lons, K),
+                number=1,
+                repeat=REPEAT,
+            )
+        )
+        print(
+            f"{metric:>9}  {CARETAKERS} caretakers  "
+            f"scalar {scalar * 1e3:8.2f} ms/owner  "
+            f"vector {vector * 1e3:8.2f} ms/owner  "
+            f"batch {batch / OWNERS * 1e3:8.2f} ms/owner ({OWNERS} owners)"
+        )
+
+
+if __name__ == "__main__":
+    main()
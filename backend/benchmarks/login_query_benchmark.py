@@ -0,0 +1,88 @@
+"""
+Compare login lookups per second: full Owner entity vs credential columns
+
+Seeds OWNERS throwaway owners, then runs LOOKUPS email lookups with
+CONCURRENCY sessions in flight, once through owner_service.get_owner_by_email
+(the old login path) and once through get_owner_credentials_by_email.
+Password verification is left out so only the query path is measured.
+The seeded owners are deleted afterwards.
+
+Run from the backend directory with the usual .env settings (point
+ASYNC_DATABASE_URL at a scratch database):
+    python -m benchmarks.login_query_benchmark
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from sqlalchemy import delete
+from database import db, owner_service
+from models import models
+
+OWNERS = 1000
+LOOKUPS = 5000
+CONCURRENCY = 8
+EMAIL_DOMAIN = "login-benchmark.invalid"
+
+
+async def seed():
+    async with db.AsyncSessionLocal() as db_session:
+        db_session.add_all(
+            models.Owner(
+                id=str(uuid.uuid4()),
+                name=f"owner {i}",
+                address="benchmark",
+                email=f"owner{i}@{EMAIL_DOMAIN}",
+                password="$2b$12$" + "x" * 53,
+                phone=f"login-benchmark-{i}",
+                lat=0,
+                lon=0,
+            )
+            for i in range(OWNERS)
+        )
+        await db_session.commit()
+
+
+async def cleanup():
+    async with db.AsyncSessionLocal() as db_session:
+        await db_session.execute(
+            delete(models.Owner).where(models.Owner.email.like(f"%@{EMAIL_DOMAIN}"))
+        )
+        await db_session.commit()
+
+
+async def run(lookup, emails):
+    queue = iter(emails)
+
+    async def worker():
+        async with db.AsyncSessionLocal() as db_session:
+            for email in queue:
+                owner_obj = await lookup(db_session, email)
+                assert owner_obj.password
+                # a login handles one request per session, drop what it loaded
+                db_session.expunge_all()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return len(emails) / (time.perf_counter() - start)
+
+
+async def main():
+    await seed()
+    try:
+        emails = [
+            f"owner{random.randrange(OWNERS)}@{EMAIL_DOMAIN}" for _ in range(LOOKUPS)
+        ]
+        for name, lookup in (
+            ("entity", owner_service.get_owner_by_email),
+            ("columns", owner_service.get_owner_credentials_by_email),
+        ):
+            await run(lookup, emails[:200])
+            print(f"{name:>7}  {await run(lookup, emails):8.1f} lookups/s")
+    finally:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
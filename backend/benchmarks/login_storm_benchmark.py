@@ -0,0 +1,66 @@
+"""
+Measure how a burst of logins affects the latency of other requests
+
+A probe coroutine stands in for a cheap endpoint: it sleeps for 1 ms and
+records how late it was woken up. While it runs, a storm of concurrent
+password verifications is started, either inline on the event loop (the old
+login path) or through the hashing worker pool.
+
+Run from the backend directory with the usual .env settings:
+    python -m benchmarks.login_storm_benchmark
+"""
+
+import asyncio
+import statistics
+import time
+from utils import hashing
+
+LOGINS = 32
+PROBE_INTERVAL = 0.001
+
+
+async def probe(latencies, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        latencies.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def inline_login(password, hashed_password):
+    return hashing.verify_password(password, hashed_password)
+
+
+async def pooled_login(password, hashed_password):
+    return await hashing.verify_password_async(password, hashed_password)
+
+
+async def storm(login, hashed_password):
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(login("password", hashed_password) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return elapsed, latencies
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def main():
+    hashed_password = hashing.get_hashed_password("password")
+    for name, login in (("inline", inline_login), ("pooled", pooled_login)):
+        elapsed, latencies = await storm(login, hashed_password)
+        print(
+            f"{name:>6}  {LOGINS / elapsed:7.1f} logins/s  "
+            f"probe p50 {statistics.median(latencies) * 1e3:7.2f} ms  "
+            f"p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  "
+            f"max {max(latencies) * 1e3:7.2f} ms  ({len(latencies)} probes)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Check that list endpoints run the same number of queries whatever their size
+
+Seeds one owner with SMALL and then LARGE pets and bookings, calls each list
+endpoint through the app and asserts its statement count with
+utils.query_counter. A count that grows with the number of rows means some
+serialised relationship is loaded per row; add it to the endpoint's profile
+in database/loaders.py.
+
+Needs the dev dependencies (httpx for the test client). Run from the backend
+directory against a scratch database:
+    python -m benchmarks.query_count_check
+"""
+
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from app.main import app
+from database import db
+from models import models
+from utils import token
+from utils.query_counter import QueryCounter, assert_query_count
+
+SMALL = 1
+LARGE = 50
+EMAIL = "owner@query-count.invalid"
+
+
+async def seed(rows):
+    async with db.AsyncSessionLocal() as db_session:
+        owner_obj = models.Owner(
+            id="query-count-owner",
+            name="owner",
+            address="benchmark",
+            email=EMAIL,
+            password="x",
+            phone="query-count",
+            lat=0,
+            lon=0,
+        )
+        caretaker_obj = models.Caretaker(
+            id="query-count-caretaker",
+            name="caretaker",
+            address="benchmark",
+            email="caretaker@query-count.invalid",
+            password="x",
+            phone="query-count",
+            lat=0,
+            lon=0,
+        )
+        db_session.add_all([owner_obj, caretaker_obj])
+        await db_session.flush()
+        now = datetime.utcnow()
+        for i in range(rows):
+            db_session.add(
+                models.Pet(
+                    id=f"query-count-pet-{i}",
+                    name="pet",
+                    age=1,
+                    breed="breed",
+                    gender="f",
+                    owner_id=owner_obj.id,
+                )
+            )
+            db_session.add(
+                models.Booking(
+                    id=f"query-count-booking-{i}",
+                    owner_id=owner_obj.id,
+                    caretaker_id=caretaker_obj.id,
+                    date_of_booking=now - timedelta(days=i),
+                    instruction="walk",
+                )
+            )
+        await db_session.commit()
+
+
+async def cleanup():
+    async with db.AsyncSessionLocal() as db_session:
+        for model, column in (
+            (models.Pet, models.Pet.owner_id),
+            (models.Booking, models.Booking.owner_id),
+            (models.OwnerToken, models.OwnerToken.owner_id),
+        ):
+            await db_session.execute(delete(model).where(column == "query-count-owner"))
+        await db_session.execute(
+            delete(models.Owner).where(models.Owner.id == "query-count-owner")
+        )
+        await db_session.execute(
+            delete(models.Caretaker).where(
+                models.Caretaker.id == "query-count-caretaker"
+            )
+        )
+        await db_session.commit()
+
+
+def endpoint_counts(client, headers):
+    counts = {}
+    for path in (
+        "/api/v1/owner/owner_pet/query-count-owner",
+        f"/api/v1/owner/owner_booking/query-count-owner?limit={LARGE}",
+        f"/api/v1/caretaker/booking/query-count-caretaker?limit={LARGE}",
+    ):
+        with QueryCounter(db.async_engine) as counter:
+            response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.text)
+        counts[path] = counter.count
+    return counts
+
+
+def main():
+    headers = {
+        "authorization": "Bearer " + token.create_access_token("query-count-owner")
+    }
+    baseline = {}
+    # one event loop for the app and the seeding, pooled connections stay valid
+    with TestClient(app) as client:
+        for rows in (SMALL, LARGE):
+            client.portal.call(cleanup)
+            client.portal.call(seed, rows)
+            # the first request warms the principal cache, measure the second
+            endpoint_counts(client, headers)
+            counts = endpoint_counts(client, headers)
+            for path, count in counts.items():
+                print(f"{rows:>4} rows  {count:>3} queries  {path}")
+                baseline.setdefault(path, count)
+                with assert_query_count(db.async_engine, baseline[path]):
+                    client.get(path, headers=headers)
+        client.portal.call(cleanup)
+
+
+if __name__ == "__main__":
+    main()
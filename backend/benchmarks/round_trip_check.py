@@ -0,0 +1,170 @@
+"""
+Print the database round-trips of each request in a typical write session
+
+Signs an owner and a caretaker up and in, edits them, adds a pet,
+books the caretaker, refreshes the access token and signs out, counting
+BEGIN/COMMIT/ROLLBACK and every statement with
+utils.query_counter.RoundTripCounter. With one unit of work per request a
+write costs its statements plus a single COMMIT; a count that goes up again
+points at a service committing or refreshing on its own.
+
+Needs the dev dependencies (httpx for the test client). Run from the backend
+directory against a scratch database:
+    python -m benchmarks.round_trip_check
+"""
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from app.main import app
+from database import db
+from models import models
+from utils.query_counter import RoundTripCounter
+
+OWNER = {
+    "name": "owner",
+    "address": "benchmark",
+    "email": "owner@round-trip.invalid",
+    "password": "round-trip",
+    "phone": "round-trip-owner",
+    "lat": 0,
+    "lon": 0,
+}
+CARETAKER = {
+    "name": "caretaker",
+    "address": "benchmark",
+    "email": "caretaker@round-trip.invalid",
+    "password": "round-trip",
+    "phone": "round-trip-caretaker",
+    "lat": 1,
+    "lon": 1,
+}
+
+
+async def cleanup():
+    async with db.AsyncSessionLocal() as db_session:
+        owner_ids = select(models.Owner.id).where(models.Owner.email == OWNER["email"])
+        caretaker_ids = select(models.Caretaker.id).where(
+            models.Caretaker.email == CARETAKER["email"]
+        )
+        for model, column in (
+            (models.Pet, models.Pet.owner_id),
+            (models.Booking, models.Booking.owner_id),
+            (models.OwnerToken, models.OwnerToken.owner_id),
+            (models.Owner, models.Owner.id),
+        ):
+            await db_session.execute(delete(model).where(column.in_(owner_ids)))
+        for model, column in (
+            (models.Booking, models.Booking.caretaker_id),
+            (models.CaretakerToken, models.CaretakerToken.caretaker_id),
+            (models.Caretaker, models.Caretaker.id),
+        ):
+            await db_session.execute(delete(model).where(column.in_(caretaker_ids)))
+        await db_session.commit()
+
+
+def measure(client, name, method, path, **kwargs):
+    with RoundTripCounter(db.async_engine) as counter:
+        response = client.request(method, path, **kwargs)
+    assert response.status_code < 300, (name, response.text)
+    print(f"{counter.count:>3} round-trips  {name}")
+    return counter.count, response
+
+
+def main():
+    total = 0
+    with TestClient(app) as client:
+        client.portal.call(cleanup)
+        count, response = measure(
+            client, "owner signup", "POST", "/api/v1/owner/signup", json=OWNER
+        )
+        total += count
+        count, response = measure(
+            client,
+            "caretaker signup",
+            "POST",
+            "/api/v1/caretaker/signup",
+            json=CARETAKER,
+        )
+        total += count
+        count, response = measure(
+            client,
+            "caretaker signin",
+            "POST",
+            "/api/v1/authentication/caretaker_signin",
+            json={"username": CARETAKER["email"], "password": CARETAKER["password"]},
+        )
+        total += count
+        caretaker_id = response.json()["id"]
+        count, response = measure(
+            client,
+            "owner signin",
+            "POST",
+            "/api/v1/authentication/owner_signin",
+            json={"username": OWNER["email"], "password": OWNER["password"]},
+        )
+        total += count
+        tokens = response.json()
+        owner_id = tokens["id"]
+        headers = {"authorization": "Bearer " + tokens["access_token"]}
+        refresh_headers = {"authorization": "Bearer " + tokens["refresh_token"]}
+
+        for name, method, path, kwargs in (
+            (
+                "edit owner",
+                "PUT",
+                f"/api/v1/owner/{owner_id}",
+                {"json": {**OWNER, "id": owner_id, "address": "edited"}},
+            ),
+            (
+                "add pet",
+                "POST",
+                "/api/v1/owner/add_pet",
+                {
+                    "json": {
+                        "name": "pet",
+                        "age": 1,
+                        "breed": "breed",
+                        "gender": "f",
+                        "owner_id": owner_id,
+                    }
+                },
+            ),
+            (
+                "create booking",
+                "POST",
+                "/api/v1/owner/booking",
+                {
+                    "json": {
+                        "caretaker_id": caretaker_id,
+                        "owner_id": owner_id,
+                        "instruction": "walk",
+                    }
+                },
+            ),
+        ):
+            count, _ = measure(client, name, method, path, headers=headers, **kwargs)
+            total += count
+        count, response = measure(
+            client,
+            "refresh access token",
+            "POST",
+            "/api/v1/authentication/owner_token_refresh",
+            headers=refresh_headers,
+        )
+        total += count
+        # the refresh replaced the stored access token, sign out with the new one
+        headers = {"authorization": "Bearer " + response.json()["access_token"]}
+        count, _ = measure(
+            client,
+            "owner signout",
+            "POST",
+            "/api/v1/authentication/owner_signout",
+            headers=headers,
+        )
+        total += count
+        client.portal.call(cleanup)
+    print(f"{total:>3} round-trips  total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the response_model and direct serialization of a 10k booking list
+
+The "response_model" path is what FastAPI does with ORM objects returned from
+a route declaring response_model=List[ShowBookingSchema]: validate every row
+with from_orm, run the result through jsonable_encoder and render it with the
+stdlib json module. The "direct" path is utils.serializers: read the schema
+fields off each row and render once with orjson. Both produce the same JSON
+document. Rows are built in memory, no database is needed.
+
+Run from the backend directory:
+    python -m benchmarks.serialization_benchmark
+"""
+
+import asyncio
+import json
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models import models
+from schemas import booking
+from utils import serializers
+
+ROWS = 10_000
+REPEAT = 5
+
+response_field = create_response_field(
+    name="response", type_=List[booking.ShowBookingSchema]
+)
+
+
+def response_model_render(booking_objs):
+    content = asyncio.run(
+        serialize_response(field=response_field, response_content=booking_objs)
+    )
+    return JSONResponse(content).body
+
+
+def direct_render(booking_objs):
+    return serializers.json_response(
+        serializers.booking_serializer.many(booking_objs)
+    ).body
+
+
+def main():
+    now = datetime(2024, 1, 1)
+    booking_objs = [
+        models.Booking(
+            id=f"booking-{i}",
+            caretaker_id=f"caretaker-{i % 100}",
+            owner_id=f"owner-{i % 1000}",
+            date_of_booking=now - timedelta(minutes=i),
+            instruction="walk twice, feed once",
+        )
+        for i in range(ROWS)
+    ]
+    assert json.loads(response_model_render(booking_objs)) == json.loads(
+        direct_render(booking_objs)
+    )
+
+    for name, render in (
+        ("response_model", response_model_render),
+        ("direct", direct_render),
+    ):
+        seconds = min(
+            timeit.repeat(lambda: render(booking_objs), number=1, repeat=REPEAT)
+        )
+        print(
+            f"{name:>14}  {seconds * 1000:8.1f} ms  "
+            f"({len(render(booking_objs)) / 1024:.0f} KiB for {ROWS} rows)"
+        )
+
+
+if __name__ == "__main__":
+    main()
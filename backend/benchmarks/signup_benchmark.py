@@ -0,0 +1,121 @@
+"""
+Compare owner signups per second: lookups + insert vs a single insert
+
+The "checked" path is the old signup: look the email and the phone up, then
+add the owner, commit and refresh it. The "insert" path is
+owner_service.create_owner, one INSERT ... RETURNING that leaves duplicate
+detection to the unique constraints. Passwords are pre-hashed so only the
+database work is measured. Every SIGNUPS-th signup reuses an email to
+exercise the conflict path. The created owners are deleted afterwards.
+
+Run from the backend directory with the usual .env settings (point
+ASYNC_DATABASE_URL at a scratch database):
+    python -m benchmarks.signup_benchmark
+"""
+
+import asyncio
+import time
+import uuid
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from database import db, owner_service
+from models import models
+
+SIGNUPS = 2000
+CONCURRENCY = 8
+DUPLICATE_EVERY = 10
+EMAIL_DOMAIN = "signup-benchmark.invalid"
+HASHED_PASSWORD = "$2b$12$" + "x" * 53
+
+
+async def checked_signup(db_session, unique_id, email, phone):
+    if await owner_service.get_owner_by_email(db_session, email):
+        return None
+    if await owner_service.get_owner_by_phone(db_session, phone):
+        return None
+    new_owner = models.Owner(
+        id=unique_id,
+        name="owner",
+        address="benchmark",
+        email=email,
+        password=HASHED_PASSWORD,
+        phone=phone,
+        lat=0,
+        lon=0,
+    )
+    db_session.add(new_owner)
+    try:
+        await db_session.commit()
+    except IntegrityError:
+        # both lookups passed but a concurrent signup got there first
+        await db_session.rollback()
+        return None
+    await db_session.refresh(new_owner)
+    return new_owner
+
+
+async def insert_signup(db_session, unique_id, email, phone):
+    try:
+        new_owner = await owner_service.create_owner(
+            db_session,
+            unique_id,
+            "owner",
+            "benchmark",
+            email,
+            HASHED_PASSWORD,
+            phone,
+            0,
+            0,
+        )
+        await db_session.commit()
+        return new_owner
+    except IntegrityError:
+        return None
+
+
+async def cleanup():
+    async with db.AsyncSessionLocal() as db_session:
+        await db_session.execute(
+            delete(models.Owner).where(models.Owner.email.like(f"%@{EMAIL_DOMAIN}"))
+        )
+        await db_session.commit()
+
+
+async def run(name, signup):
+    requests = iter(range(SIGNUPS))
+    created = []
+
+    async def worker():
+        for i in requests:
+            # every DUPLICATE_EVERY-th request repeats the previous email
+            n = i - 1 if i % DUPLICATE_EVERY == 0 and i else i
+            async with db.AsyncSessionLocal() as db_session:
+                new_owner = await signup(
+                    db_session,
+                    str(uuid.uuid4()),
+                    f"{name}{n}@{EMAIL_DOMAIN}",
+                    f"{name}-{i}",
+                )
+            created.append(new_owner is not None)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    await cleanup()
+    return SIGNUPS / elapsed, sum(created)
+
+
+async def main():
+    try:
+        for name, signup in (("checked", checked_signup), ("insert", insert_signup)):
+            signups_per_second, created = await run(name, signup)
+            print(
+                f"{name:>7}  {signups_per_second:8.1f} signups/s  "
+                f"({created} created, {SIGNUPS - created} rejected)"
+            )
+    finally:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,46 +1,66 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import models
 from datetime import datetime
 
 
-def get_owner(db: Session, owner_id: str):
-    owner_obj = (
-        db.query(models.OwnerToken)
-        .filter(models.OwnerToken.owner_id == owner_id)
-        .first()
+async def get_owner(db: AsyncSession, owner_id: str):
+    owner_obj = await db.scalar(
+        select(models.OwnerToken).filter(models.OwnerToken.owner_id == owner_id)
     )
     return owner_obj
 
 
-def get_caretaker(db: Session, caretaker_id: str):
-    caretaker_obj = (
-        db.query(models.CaretakerToken)
-        .filter(models.CaretakerToken.caretaker_id == caretaker_id)
-        .first()
+async def get_caretaker(db: AsyncSession, caretaker_id: str):
+    caretaker_obj = await db.scalar(
+        select(models.CaretakerToken).filter(
+            models.CaretakerToken.caretaker_id == caretaker_id
+        )
     )
     return caretaker_obj
 
 
-def get_owner_tokens(db: Session, owner_id: str):
-    owner_obj = (
-        db.query(models.OwnerToken)
-        .filter(models.OwnerToken.owner_id == owner_id)
-        .first()
+async def get_owner_tokens(db: AsyncSession, owner_id: str):
+    owner_objs = await db.scalars(
+        select(models.OwnerToken).filter(
+            models.OwnerToken.owner_id == owner_id,
+            models.OwnerToken.revoked_at.is_(None),
+        )
+    )
+    return owner_objs.all()
+
+
+async def get_caretaker_tokens(db: AsyncSession, caretaker_id: str):
+    caretaker_objs = await db.scalars(
+        select(models.CaretakerToken).filter(
+            models.CaretakerToken.caretaker_id == caretaker_id,
+            models.CaretakerToken.revoked_at.is_(None),
+        )
+    )
+    return caretaker_objs.all()
+
+
+async def get_owner_token_by_refresh_token(db: AsyncSession, refresh_token: str):
+    owner_obj = await db.scalar(
+        select(models.OwnerToken).filter(
+            models.OwnerToken.refresh_token == refresh_token
+        )
     )
     return owner_obj
 
 
-def get_caretaker_tokens(db: Session, caretaker_id: str):
-    caretaker_obj = (
-        db.query(models.CaretakerToken)
-        .filter(models.CaretakerToken.caretaker_id == caretaker_id)
-        .first()
+async def get_caretaker_token_by_refresh_token(db: AsyncSession, refresh_token: str):
+    caretaker_obj = await db.scalar(
+        select(models.CaretakerToken).filter(
+            models.CaretakerToken.refresh_token == refresh_token
+        )
     )
     return caretaker_obj
 
 
-def store_owner_tokens(
-    db: Session,
+async def store_owner_tokens(
+    db: AsyncSession,
+    unique_id: str,
     owner_id: str,
     access_token: str,
     access_token_expiry: datetime,
@@ -48,6 +68,7 @@ def store_owner_tokens(
     refresh_token_expiry: datetime,
 ):
     new_token = models.OwnerToken(
+        id=unique_id,
         owner_id=owner_id,
         access_token=access_token,
         access_token_expiry=access_token_expiry,
@@ -55,13 +76,13 @@ def store_owner_tokens(
         refresh_token_expiry=refresh_token_expiry,
     )
     db.add(new_token)
-    db.commit()
-    db.refresh(new_token)
+    await db.flush()
     return new_token
 
 
-def store_caretaker_tokens(
-    db: Session,
+async def store_caretaker_tokens(
+    db: AsyncSession,
+    unique_id: str,
     caretaker_id: str,
     access_token: str,
     access_token_expiry: datetime,
@@ -69,6 +90,7 @@ def store_caretaker_tokens(
     refresh_token_expiry: datetime,
 ):
     new_token = models.CaretakerToken(
+        id=unique_id,
         caretaker_id=caretaker_id,
         access_token=access_token,
         access_token_expiry=access_token_expiry,
@@ -76,39 +98,36 @@ def store_caretaker_tokens(
         refresh_token_expiry=refresh_token_expiry,
     )
     db.add(new_token)
-    db.commit()
-    db.refresh(new_token)
+    await db.flush()
     return new_token
 
 
-def edit_owner_access_token(
-    db: Session,
+async def edit_owner_access_token(
+    db: AsyncSession,
     owner_obj: models.OwnerToken,
     access_token: str,
     access_token_expiry: datetime,
 ):
     owner_obj.access_token = access_token
     owner_obj.access_token_expiry = access_token_expiry
-    db.commit()
-    db.refresh(owner_obj)
+    await db.flush()
     return owner_obj
 
 
-def edit_caretaker_access_token(
-    db: Session,
+async def edit_caretaker_access_token(
+    db: AsyncSession,
     caretaker_obj: models.CaretakerToken,
     access_token: str,
     access_token_expiry: datetime,
 ):
     caretaker_obj.access_token = access_token
     caretaker_obj.access_token_expiry = access_token_expiry
-    db.commit()
-    db.refresh(caretaker_obj)
+    await db.flush()
     return caretaker_obj
 
 
-def edit_owner_all_tokens(
-    db: Session,
+async def edit_owner_all_tokens(
+    db: AsyncSession,
     owner_obj: models.OwnerToken,
     access_token: str,
     access_token_expiry: datetime,
@@ -119,13 +138,12 @@ def edit_owner_all_tokens(
     owner_obj.access_token_expiry = access_token_expiry
     owner_obj.refresh_token = refresh_token
     owner_obj.refresh_token_expiry = refresh_token_expiry
-    db.commit()
-    db.refresh(owner_obj)
+    await db.flush()
     return owner_obj
 
 
-def edit_caretaker_all_tokens(
-    db: Session,
+async def edit_caretaker_all_tokens(
+    db: AsyncSession,
     caretaker_obj: models.CaretakerToken,
     access_token: str,
     access_token_expiry: datetime,
@@ -136,6 +154,129 @@ def edit_caretaker_all_tokens(
     caretaker_obj.access_token_expiry = access_token_expiry
     caretaker_obj.refresh_token = refresh_token
     caretaker_obj.refresh_token_expiry = refresh_token_expiry
-    db.commit()
-    db.refresh(caretaker_obj)
+    await db.flush()
     return caretaker_obj
+
+
+async def revoke_owner_tokens(
+    db: AsyncSession, owner_id: str, access_token: str = None
+):
+    # Revokes the row holding access_token, or every live row of the owner,
+    # and returns the digests/expiries so they can be added to the revocation set
+    statement = update(models.OwnerToken).where(
+        models.OwnerToken.owner_id == owner_id,
+        models.OwnerToken.revoked_at.is_(None),
+    )
+    if access_token is not None:
+        statement = statement.where(models.OwnerToken.access_token == access_token)
+    revoked = await db.execute(
+        statement.values(revoked_at=datetime.utcnow())
+        .returning(
+            models.OwnerToken.access_token,
+            models.OwnerToken.access_token_expiry,
+            models.OwnerToken.refresh_token,
+            models.OwnerToken.refresh_token_expiry,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    revoked = revoked.all()
+    return revoked
+
+
+async def revoke_caretaker_tokens(
+    db: AsyncSession, caretaker_id: str, access_token: str = None
+):
+    # Revokes the row holding access_token, or every live row of the caretaker,
+    # and returns the digests/expiries so they can be added to the revocation set
+    statement = update(models.CaretakerToken).where(
+        models.CaretakerToken.caretaker_id == caretaker_id,
+        models.CaretakerToken.revoked_at.is_(None),
+    )
+    if access_token is not None:
+        statement = statement.where(models.CaretakerToken.access_token == access_token)
+    revoked = await db.execute(
+        statement.values(revoked_at=datetime.utcnow())
+        .returning(
+            models.CaretakerToken.access_token,
+            models.CaretakerToken.access_token_expiry,
+            models.CaretakerToken.refresh_token,
+            models.CaretakerToken.refresh_token_expiry,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    revoked = revoked.all()
+    return revoked
+
+
+async def revoke_access_token(
+    db: AsyncSession, access_token: str, access_token_expiry: datetime
+):
+    # Records an access token replaced by a refresh, the token row moves on to
+    # the new digest so the old one would otherwise stay valid until it expires
+    revoked_obj = models.RevokedAccessToken(
+        access_token=access_token,
+        access_token_expiry=access_token_expiry,
+        revoked_at=datetime.utcnow(),
+    )
+    db.add(revoked_obj)
+    await db.flush()
+    return revoked_obj
+
+
+async def get_revoked_tokens(db: AsyncSession, revoked_since: datetime = None):
+    # Digests of revoked rows that have not expired yet, optionally only those
+    # revoked since the last sync
+    revoked = []
+    now = datetime.utcnow()
+    for token_model in (models.OwnerToken, models.CaretakerToken):
+        statement = select(
+            token_model.access_token,
+            token_model.access_token_expiry,
+            token_model.refresh_token,
+            token_model.refresh_token_expiry,
+        ).where(
+            token_model.revoked_at.is_not(None),
+            or_(
+                token_model.access_token_expiry > now,
+                token_model.refresh_token_expiry > now,
+            ),
+        )
+        if revoked_since is not None:
+            statement = statement.where(token_model.revoked_at >= revoked_since)
+        revoked.extend((await db.execute(statement)).all())
+    return revoked
+
+
+async def get_revoked_access_tokens(db: AsyncSession, revoked_since: datetime = None):
+    # Digests of unexpired access tokens superseded by a refresh
+    statement = select(
+        models.RevokedAccessToken.access_token,
+        models.RevokedAccessToken.access_token_expiry,
+    ).where(models.RevokedAccessToken.access_token_expiry > datetime.utcnow())
+    if revoked_since is not None:
+        statement = statement.where(
+            models.RevokedAccessToken.revoked_at >= revoked_since
+        )
+    return (await db.execute(statement)).all()
+
+
+async def delete_expired_access_token_revocations(db: AsyncSession):
+    # An expired token fails the JWT check, its revocation row is no longer needed
+    await db.execute(
+        delete(models.RevokedAccessToken).where(
+            models.RevokedAccessToken.access_token_expiry <= datetime.utcnow()
+        )
+    )
+
+
+async def delete_expired_tokens(db: AsyncSession):
+    # Token rows whose refresh and access tokens have both expired can no longer
+    # be used or revoked, signin adds one per login so they have to go
+    now = datetime.utcnow()
+    for token_model in (models.OwnerToken, models.CaretakerToken):
+        await db.execute(
+            delete(token_model).where(
+                token_model.refresh_token_expiry <= now,
+                token_model.access_token_expiry <= now,
+            )
+        )
@@ -1,10 +1,87 @@
-from sqlalchemy.orm import Session
+import math
+from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import (
+    Float,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import models
-from utils import recommendation
+from database import loaders
+from database.db import after_commit, bulk_insert, bump_version
+from database.config import dbsettings, recommendationsettings
+from utils import principal, recommendation, spatial_index
 
+# Per process: kept current by the after_commit hooks of this process and
+# reloaded every CARETAKER_LOCATION_SYNC_SECONDS by utils.location_sync
+caretaker_index = spatial_index.GridIndex(
+    recommendationsettings.SPATIAL_INDEX_CELL_SIZE
+)
+caretaker_engine = recommendation.DistanceEngine(
+    recommendationsettings.DISTANCE_METRIC,
+    int(recommendationsettings.RECOMMENDATION_MEMORY_BUDGET_MB * 2**20),
+)
+scoring_pipeline = recommendation.ScoringPipeline(
+    [
+        (recommendationsettings.DISTANCE_WEIGHT, recommendation.distance_signal),
+        (
+            recommendationsettings.RATING_WEIGHT,
+            partial(
+                recommendation.rating_signal,
+                max_rating=recommendationsettings.MAX_RATING,
+            ),
+        ),
+        (
+            recommendationsettings.BOOKING_LOAD_WEIGHT,
+            recommendation.booking_load_signal,
+        ),
+    ]
+)
+
+
+async def get_caretaker_locations(db: AsyncSession):
+    caretaker_locations = (
+        await db.execute(
+            select(models.Caretaker.id, models.Caretaker.lat, models.Caretaker.lon)
+        )
+    ).all()
+    return [
+        (caretaker_location.id, caretaker_location.lat, caretaker_location.lon)
+        for caretaker_location in caretaker_locations
+    ]
+
+
+async def load_caretaker_index(db: AsyncSession):
+    caretaker_index.load(await get_caretaker_locations(db))
+
+
+async def load_caretaker_engine(db: AsyncSession):
+    caretaker_engine.load(await get_caretaker_locations(db))
 
-def create_caretaker(
-    db: Session,
+
+def index_caretakers(caretaker_locations: List[Tuple[str, float, float]]):
+    for caretaker_id, lat, lon in caretaker_locations:
+        caretaker_index.insert(caretaker_id, lat, lon)
+    caretaker_engine.clear()
+
+
+def unindex_caretaker(caretaker_id: str):
+    caretaker_index.remove(caretaker_id)
+    caretaker_engine.clear()
+
+
+async def create_caretaker(
+    db: AsyncSession,
     unique_id: str,
     name: str,
     address: str,
@@ -13,57 +90,112 @@ def create_caretaker(
     phone: str,
     lat: int,
     lon: int,
-    rating: int,
 ):
-    new_caretaker = models.Caretaker(
-        id=unique_id,
-        name=name,
-        address=address,
-        email=email,
-        password=password,
-        phone=phone,
-        lat=lat,
-        lon=lon,
-        rating=rating,
-    )
-    db.add(new_caretaker)
-    db.commit()
-    db.refresh(new_caretaker)
+    # One INSERT ... RETURNING; duplicate email/phone surface as IntegrityError
+    # from the unique constraints, see db.get_unique_violation
+    try:
+        new_caretaker = await db.scalar(
+            insert(models.Caretaker)
+            .values(
+                id=unique_id,
+                name=name,
+                address=address,
+                email=email,
+                password=password,
+                phone=phone,
+                lat=lat,
+                lon=lon,
+            )
+            .returning(models.Caretaker)
+        )
+    except IntegrityError:
+        await db.rollback()
+        raise
+    caretaker_location = (new_caretaker.id, new_caretaker.lat, new_caretaker.lon)
+    after_commit(db, partial(index_caretakers, [caretaker_location]))
     return new_caretaker
 
 
-def get_caretaker_by_id(db: Session, caretaker_id: str):
-    caretaker_obj = (
-        db.query(models.Caretaker).filter(models.Caretaker.id == caretaker_id).first()
+async def bulk_create_caretakers(db: AsyncSession, caretakers: List[dict]):
+    failures = await bulk_insert(db, models.Caretaker, caretakers)
+    failed = {row_index for row_index, _ in failures}
+    caretaker_locations = [
+        (new_caretaker["id"], new_caretaker["lat"], new_caretaker["lon"])
+        for row_index, new_caretaker in enumerate(caretakers)
+        if row_index not in failed
+    ]
+    after_commit(db, partial(index_caretakers, caretaker_locations))
+    return failures
+
+
+async def get_caretaker_by_id(db: AsyncSession, caretaker_id: str):
+    caretaker_obj = await db.scalar(
+        select(models.Caretaker).filter(models.Caretaker.id == caretaker_id)
     )
     return caretaker_obj
 
 
-def get_caretaker_by_email(db: Session, caretaker_email: str):
-    caretaker_obj = (
-        db.query(models.Caretaker)
-        .filter(models.Caretaker.id == caretaker_email)
-        .first()
+async def get_caretaker_version(db: AsyncSession, caretaker_id: str):
+    # Just the row version, enough to answer a conditional GET
+    version_id = await db.scalar(
+        select(models.Caretaker.version_id).filter(models.Caretaker.id == caretaker_id)
+    )
+    return version_id
+
+
+async def get_caretaker_by_email(db: AsyncSession, caretaker_email: str):
+    caretaker_obj = await db.scalar(
+        select(models.Caretaker).filter(models.Caretaker.email == caretaker_email)
     )
     return caretaker_obj
 
 
-def get_caretaker_by_phone(db: Session, caretaker_phone: str):
-    caretaker_obj = (
-        db.query(models.Caretaker)
-        .filter(models.Caretaker.id == caretaker_phone)
-        .first()
+async def get_caretaker_credentials_by_email(db: AsyncSession, caretaker_email: str):
+    # Only the columns a login needs, as a plain row outside the identity map
+    caretaker_row = (
+        await db.execute(
+            select(
+                models.Caretaker.id, models.Caretaker.name, models.Caretaker.password
+            ).filter(models.Caretaker.email == caretaker_email)
+        )
+    ).first()
+    return caretaker_row
+
+
+async def get_caretaker_by_phone(db: AsyncSession, caretaker_phone: str):
+    caretaker_obj = await db.scalar(
+        select(models.Caretaker).filter(models.Caretaker.phone == caretaker_phone)
     )
     return caretaker_obj
 
 
-def get_all_caretakers(db: Session):
-    caretaker_objs = db.query(models.Caretaker).all()
+async def get_all_caretakers(db: AsyncSession):
+    caretaker_objs = (await db.scalars(select(models.Caretaker))).all()
+    return caretaker_objs
+
+
+async def get_caretakers_page(db: AsyncSession, after_id: Optional[str], limit: int):
+    # Keyset pagination on the primary key, no OFFSET scan
+    statement = select(models.Caretaker).order_by(models.Caretaker.id).limit(limit)
+    if after_id is not None:
+        statement = statement.where(models.Caretaker.id > after_id)
+    caretaker_objs = (await db.scalars(statement)).all()
     return caretaker_objs
 
 
-def edit_caretaker(
-    db: Session,
+async def stream_caretakers(db: AsyncSession):
+    # Server-side cursor fetched DB_STREAM_YIELD_PER rows at a time
+    caretaker_objs = await db.stream_scalars(
+        select(models.Caretaker)
+        .order_by(models.Caretaker.id)
+        .execution_options(yield_per=dbsettings.DB_STREAM_YIELD_PER)
+    )
+    async for caretaker_obj in caretaker_objs:
+        yield caretaker_obj
+
+
+async def edit_caretaker(
+    db: AsyncSession,
     caretaker_obj: models.Caretaker,
     address: str,
     email: str,
@@ -76,89 +208,391 @@ def edit_caretaker(
     caretaker_obj.phone = phone
     caretaker_obj.lat = lat
     caretaker_obj.lon = lon
-    db.commit()
-    db.refresh(caretaker_obj)
+    bump_version(caretaker_obj)
+    await db.flush()
+    caretaker_location = (caretaker_obj.id, caretaker_obj.lat, caretaker_obj.lon)
+    after_commit(db, partial(index_caretakers, [caretaker_location]))
+    after_commit(db, partial(principal.invalidate_caretaker, caretaker_obj.id))
     return caretaker_obj
 
 
-def edit_caretaker_email(db: Session, caretaker_obj: models.Caretaker, email: str):
+async def edit_caretaker_email(
+    db: AsyncSession, caretaker_obj: models.Caretaker, email: str
+):
     caretaker_obj.email = email
-    db.commit()
-    db.refresh(caretaker_obj)
+    bump_version(caretaker_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_caretaker, caretaker_obj.id))
     return caretaker_obj
 
 
-def edit_caretaker_phone(db: Session, caretaker_obj: models.Caretaker, phone: str):
+async def edit_caretaker_phone(
+    db: AsyncSession, caretaker_obj: models.Caretaker, phone: str
+):
     caretaker_obj.phone = phone
-    db.commit()
-    db.refresh(caretaker_obj)
+    bump_version(caretaker_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_caretaker, caretaker_obj.id))
     return caretaker_obj
 
 
-def edit_caretaker_rating(db: Session, caretaker_obj: models.Caretaker, rating: float):
-    caretaker_obj.rating = rating
-    db.commit()
-    db.refresh(caretaker_obj)
-    return caretaker_obj
+async def edit_caretaker_password(db: AsyncSession, caretaker_id: str, password: str):
+    await db.execute(
+        update(models.Caretaker)
+        .where(models.Caretaker.id == caretaker_id)
+        .values(password=password)
+        .execution_options(synchronize_session=False)
+    )
 
 
-def delete_caretaker(db: Session, caretaker_id: str):
-    caretaker_obj = (
-        db.query(models.Caretaker).filter(models.Owner.id == caretaker_id).first()
+async def delete_caretaker(db: AsyncSession, caretaker_id: str):
+    caretaker_obj = await db.scalar(
+        select(models.Caretaker).filter(models.Caretaker.id == caretaker_id)
     )
     if not caretaker_obj:
         return None
 
-    db.delete(caretaker_obj)
-    db.commit()
+    await db.execute(
+        delete(models.CaretakerToken).where(
+            models.CaretakerToken.caretaker_id == caretaker_id
+        )
+    )
+    await db.delete(caretaker_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_caretaker, caretaker_id))
+    after_commit(db, partial(unindex_caretaker, caretaker_id))
     return caretaker_obj
 
 
-def get_caretaker_bookings(db: Session, caretaker_id: str):
-    booking_objs = (
-        db.query(models.Booking)
+async def get_caretaker_bookings(
+    db: AsyncSession,
+    caretaker_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    limit: Optional[int] = None,
+    options: Sequence = loaders.BOOKING_LIST,
+):
+    # Newest first; after is the (date_of_booking, id) of the last row of the
+    # previous page. Served by ix_bookings_caretaker_id_date_of_booking
+    statement = (
+        select(models.Booking)
         .filter(models.Booking.caretaker_id == caretaker_id)
-        .all()
+        .order_by(models.Booking.date_of_booking.desc(), models.Booking.id.desc())
+        .options(*options)
     )
+    if start is not None:
+        statement = statement.filter(models.Booking.date_of_booking >= start)
+    if end is not None:
+        statement = statement.filter(models.Booking.date_of_booking < end)
+    if after is not None:
+        statement = statement.filter(
+            tuple_(models.Booking.date_of_booking, models.Booking.id) < after
+        )
+    if limit is not None:
+        statement = statement.limit(limit)
+    booking_objs = (await db.scalars(statement)).all()
     return booking_objs
 
 
-def get_booking_info(db: Session, booking_id: str):
-    booking_obj = (
-        db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+async def get_booking_info(db: AsyncSession, booking_id: str):
+    booking_obj = await db.scalar(
+        select(models.Booking).filter(models.Booking.id == booking_id)
     )
     return booking_obj
 
 
-def find_nearby_caretakers(db: Session, lat: int, lon: int):
-    caretaker_objs = db.query(models.Caretaker).all()
-    caretaker_dist = [
-        (
-            recommendation.compute_distance(
-                lat, lon, caretaker_obj.lat, caretaker_obj.lon
-            ),
-            caretaker_obj,
+async def get_caretakers_in_order(db: AsyncSession, caretaker_ids: List[str]):
+    caretakers_by_id = {}
+    chunk_size = dbsettings.DB_IN_LIST_CHUNK_SIZE
+    for start in range(0, len(caretaker_ids), chunk_size):
+        caretaker_objs = (
+            await db.scalars(
+                select(models.Caretaker).filter(
+                    models.Caretaker.id.in_(caretaker_ids[start : start + chunk_size])
+                )
+            )
+        ).all()
+        caretakers_by_id.update(
+            (caretaker_obj.id, caretaker_obj) for caretaker_obj in caretaker_objs
         )
-        for caretaker_obj in caretaker_objs
+    return [
+        caretakers_by_id[caretaker_id]
+        for caretaker_id in caretaker_ids
+        if caretaker_id in caretakers_by_id
     ]
-    sorted_caretaker_dist = sorted(caretaker_dist, key=lambda x: x[0])
-    return [sorted_caretaker_dist[i][1] for i in range(5)]
 
 
-def compute_caretaker_rating(db: Session, caretaker_id: str):
-    caretaker_bookings = (
-        db.query(models.Booking)
-        .filter(models.Booking.caretaker_id == caretaker_id)
-        .all()
+async def get_recent_booking_counts(db: AsyncSession, caretaker_ids: List[str]):
+    since = datetime.utcnow() - timedelta(
+        days=recommendationsettings.RECENT_BOOKING_DAYS
     )
-    booking_ids = [
-        caretaker_booking.booking_id for caretaker_booking in caretaker_bookings
-    ]
-    booking_review_objs = [
-        db.query(models.Review).filter(models.Review.booking_id == booking_id).first()
-        for booking_id in booking_ids
+    booking_counts = {}
+    chunk_size = dbsettings.DB_IN_LIST_CHUNK_SIZE
+    for start in range(0, len(caretaker_ids), chunk_size):
+        booking_counts.update(
+            (
+                await db.execute(
+                    select(models.Booking.caretaker_id, func.count(models.Booking.id))
+                    .filter(
+                        models.Booking.caretaker_id.in_(
+                            caretaker_ids[start : start + chunk_size]
+                        ),
+                        models.Booking.date_of_booking >= since,
+                    )
+                    .group_by(models.Booking.caretaker_id)
+                )
+            ).all()
+        )
+    return booking_counts
+
+
+def rank_caretakers(caretaker_dist, recent_booking_counts):
+    candidates = [
+        recommendation.Candidate(
+            caretaker_obj,
+            distance,
+            caretaker_obj.rating,
+            recent_booking_counts.get(caretaker_obj.id, 0),
+        )
+        for distance, caretaker_obj in caretaker_dist
     ]
-    caretaker_ratings = [
-        booking_review_obj.rating for booking_review_obj in booking_review_objs
+    return [candidate.key for candidate in scoring_pipeline.rank(candidates)]
+
+
+async def find_nearby_candidates(
+    db: AsyncSession, lat: int, lon: int, n: int, radius: Optional[float] = None
+):
+    if (
+        recommendationsettings.RECOMMENDATION_BACKEND == "sql"
+        and db.bind.dialect.name != "sqlite"
+    ):
+        caretaker_objs = await find_nearby_caretakers_sql(db, lat, lon, n, radius)
+        return [
+            (
+                recommendation.compute_distance(
+                    lat, lon, caretaker_obj.lat, caretaker_obj.lon
+                ),
+                caretaker_obj,
+            )
+            for caretaker_obj in caretaker_objs
+        ]
+
+    if recommendationsettings.RECOMMENDATION_BACKEND == "vector":
+        if not caretaker_engine.loaded:
+            await load_caretaker_engine(db)
+        nearest = caretaker_engine.top_k(lat, lon, n, radius)
+    else:
+        if not caretaker_index.loaded:
+            await load_caretaker_index(db)
+        degree_radius, within_radius = None, None
+        if radius is not None:
+            # the grid holds degrees, search the circle around the radius' box
+            # and keep the points that are within radius kilometres
+            degree_radius = math.hypot(*recommendation.degree_extent(lat, radius))
+
+            def within_radius(x: float, y: float) -> bool:
+                distance = recommendation.compute_haversine_distance(lat, lon, x, y)
+                return distance <= radius
+
+        nearest = caretaker_index.nearest(lat, lon, n, degree_radius, within_radius)
+    distance_by_id = {caretaker_id: distance for distance, caretaker_id in nearest}
+    # ids deleted since the index was loaded are missing, pair up by id
+    caretaker_objs = await get_caretakers_in_order(db, list(distance_by_id))
+    return [
+        (distance_by_id[caretaker_obj.id], caretaker_obj)
+        for caretaker_obj in caretaker_objs
     ]
-    return sum(caretaker_ratings) / len(caretaker_ratings)
+
+
+async def find_nearby_caretakers(
+    db: AsyncSession,
+    lat: int,
+    lon: int,
+    k: int = 5,
+    radius: Optional[float] = None,
+    skip: int = 0,
+):
+    if recommendationsettings.RECOMMENDATION_RANKING == "score":
+        pool_size = (skip + k) * recommendationsettings.CANDIDATE_POOL_FACTOR
+        caretaker_dist = await find_nearby_candidates(db, lat, lon, pool_size, radius)
+        recent_booking_counts = await get_recent_booking_counts(
+            db, [caretaker_obj.id for _, caretaker_obj in caretaker_dist]
+        )
+        caretaker_objs = rank_caretakers(caretaker_dist, recent_booking_counts)
+    else:
+        caretaker_dist = await find_nearby_candidates(db, lat, lon, skip + k, radius)
+        caretaker_objs = [caretaker_obj for _, caretaker_obj in caretaker_dist]
+    return caretaker_objs[skip : skip + k]
+
+
+async def recommend_caretakers_for_owners(
+    db: AsyncSession,
+    owner_ids: List[str],
+    k: int = 5,
+    radius: Optional[float] = None,
+):
+    if not caretaker_engine.loaded:
+        await load_caretaker_engine(db)
+
+    scored = recommendationsettings.RECOMMENDATION_RANKING == "score"
+    pool_size = k * recommendationsettings.CANDIDATE_POOL_FACTOR if scored else k
+    batch_size = recommendationsettings.RECOMMENDATION_BATCH_SIZE
+    for start in range(0, len(owner_ids), batch_size):
+        batch_owner_ids = owner_ids[start : start + batch_size]
+        # looked up per batch so the owner IN list stays small, the caretaker
+        # lookups below chunk their own lists by DB_IN_LIST_CHUNK_SIZE
+        owner_locations_by_id = {
+            owner_location.id: owner_location
+            for owner_location in (
+                await db.execute(
+                    select(models.Owner.id, models.Owner.lat, models.Owner.lon).filter(
+                        models.Owner.id.in_(batch_owner_ids)
+                    )
+                )
+            ).all()
+        }
+        batch_owners = [
+            owner_locations_by_id[owner_id]
+            for owner_id in batch_owner_ids
+            if owner_id in owner_locations_by_id
+        ]
+        nearest_per_owner = dict(
+            zip(
+                [owner_location.id for owner_location in batch_owners],
+                caretaker_engine.batch_top_k(
+                    [owner_location.lat for owner_location in batch_owners],
+                    [owner_location.lon for owner_location in batch_owners],
+                    pool_size,
+                    radius,
+                ),
+            )
+        )
+        caretaker_ids = list(
+            {
+                caretaker_id
+                for nearest in nearest_per_owner.values()
+                for _, caretaker_id in nearest
+            }
+        )
+        caretakers_by_id = {
+            caretaker_obj.id: caretaker_obj
+            for caretaker_obj in await get_caretakers_in_order(db, caretaker_ids)
+        }
+        recent_booking_counts = (
+            await get_recent_booking_counts(db, caretaker_ids) if scored else {}
+        )
+        for owner_id in batch_owner_ids:
+            if owner_id not in nearest_per_owner:
+                yield owner_id, None
+                continue
+            caretaker_dist = [
+                (distance, caretakers_by_id[caretaker_id])
+                for distance, caretaker_id in nearest_per_owner[owner_id]
+                if caretaker_id in caretakers_by_id
+            ]
+            if scored:
+                caretaker_objs = rank_caretakers(caretaker_dist, recent_booking_counts)
+            else:
+                caretaker_objs = [caretaker_obj for _, caretaker_obj in caretaker_dist]
+            yield owner_id, caretaker_objs[:k]
+
+
+def haversine_distance(lat: float, lon: float):
+    # SQL twin of recommendation.compute_haversine_distance, in kilometres
+    d_phi = func.radians(models.Caretaker.lat - lat, type_=Float)
+    d_lambda = func.radians(models.Caretaker.lon - lon, type_=Float)
+    a = func.power(func.sin(d_phi / 2), 2) + math.cos(math.radians(lat)) * func.cos(
+        func.radians(models.Caretaker.lat)
+    ) * func.power(func.sin(d_lambda / 2), 2)
+    return 2 * recommendation.EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(1.0, a)))
+
+
+async def find_nearby_caretakers_sql(
+    db: AsyncSession,
+    lat: int,
+    lon: int,
+    k: int = 5,
+    radius: Optional[float] = None,
+    skip: int = 0,
+):
+    distance = (models.Caretaker.lat - lat) * (models.Caretaker.lat - lat) + (
+        models.Caretaker.lon - lon
+    ) * (models.Caretaker.lon - lon)
+    query = (
+        select(models.Caretaker)
+        .order_by(distance, models.Caretaker.id)
+        .offset(skip)
+        .limit(k)
+    )
+    # no two lat/lon points are further apart in degrees
+    max_extent = math.hypot(180, 360)
+    if radius is not None:
+        # radius is in kilometres, the box on the lat/lon index is in degrees
+        d_lat, d_lon = recommendation.degree_extent(lat, radius)
+        query = query.filter(
+            models.Caretaker.lat.between(lat - d_lat, lat + d_lat),
+            models.Caretaker.lon.between(lon - d_lon, lon + d_lon),
+            haversine_distance(lat, lon) <= radius,
+        )
+        max_extent = math.hypot(d_lat, d_lon)
+
+    # Search a box on the lat/lon index that grows until it holds skip + k
+    # caretakers. Only rows within extent of the query point count, anything
+    # outside the box is further away than all of them.
+    extent = recommendationsettings.SQL_SEARCH_INITIAL_EXTENT
+    while extent < max_extent:
+        caretaker_objs = (
+            await db.scalars(
+                query.filter(
+                    models.Caretaker.lat.between(lat - extent, lat + extent),
+                    models.Caretaker.lon.between(lon - extent, lon + extent),
+                    distance <= extent * extent,
+                )
+            )
+        ).all()
+        if len(caretaker_objs) == k:
+            return caretaker_objs
+        extent *= recommendationsettings.SQL_SEARCH_GROWTH
+    caretaker_objs = (await db.scalars(query)).all()
+    return caretaker_objs
+
+
+async def reconcile_caretaker_ratings(db: AsyncSession):
+    def caretaker_reviews(column):
+        return (
+            select(column)
+            .select_from(models.Review)
+            .join(models.Booking, models.Booking.id == models.Review.booking_id)
+            .where(models.Booking.caretaker_id == models.Caretaker.id)
+            .scalar_subquery()
+        )
+
+    rating_sum = caretaker_reviews(func.coalesce(func.sum(models.Review.rating), 0))
+    rating_count = caretaker_reviews(func.count(models.Review.id))
+    rating = case(
+        (rating_count > 0, cast(rating_sum, Float) / rating_count),
+        else_=0,
+    )
+    # Only rows that drifted are written, so the ETags of the others stay valid
+    result = await db.execute(
+        update(models.Caretaker)
+        .where(
+            or_(
+                models.Caretaker.rating_sum != rating_sum,
+                models.Caretaker.rating_count != rating_count,
+                models.Caretaker.rating.is_distinct_from(rating),
+            )
+        )
+        .values(
+            {
+                models.Caretaker.rating_sum: rating_sum,
+                models.Caretaker.rating_count: rating_count,
+                models.Caretaker.rating: rating,
+                models.Caretaker.version_id: models.Caretaker.version_id + 1,
+            }
+        )
+        .execution_options(synchronize_session=False)
+    )
+    after_commit(db, principal.principal_cache.clear)
+    return result.rowcount
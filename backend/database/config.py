@@ -1,5 +1,5 @@
 from pydantic import BaseSettings
-from typing import Any
+from typing import Any, Literal, Optional
 
 
 class DBSettings(BaseSettings):
@@ -9,6 +9,15 @@ class DBSettings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_HOST: str
     POSTGRES_HOSTNAME: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_STREAM_YIELD_PER: int = 1000
+    # ids per IN list, asyncpg refuses statements with over 32767 parameters
+    DB_IN_LIST_CHUNK_SIZE: int = 10000
 
 
 class JWTSettings(BaseSettings):
@@ -17,12 +26,52 @@ class JWTSettings(BaseSettings):
     JWT_SECRET_KEY: str
     JWT_REFRESH_SECRET_KEY: str
     JWT_ALGORITHM: str
+    TOKEN_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    REVOCATION_SYNC_SECONDS: float = 15
     # CLIENT_ORIGIN: str
 
 
+class HashingSettings(BaseSettings):
+    PASSWORD_HASH_WORKERS: int = 4
+    BCRYPT_ROUNDS: int = 12
+
+
+class RecommendationSettings(BaseSettings):
+    RECOMMENDATION_BACKEND: Literal["index", "sql", "vector"] = "index"
+    DISTANCE_METRIC: Literal["euclidean", "haversine"] = "euclidean"
+    SPATIAL_INDEX_CELL_SIZE: float = 1.0
+    CARETAKER_LOCATION_SYNC_SECONDS: float = 60
+    SQL_SEARCH_INITIAL_EXTENT: float = 1.0
+    SQL_SEARCH_GROWTH: float = 4.0
+    RECOMMENDATION_BATCH_SIZE: int = 256
+    RECOMMENDATION_MEMORY_BUDGET_MB: float = 32
+    RECOMMENDATION_RANKING: Literal["distance", "score"] = "distance"
+    CANDIDATE_POOL_FACTOR: int = 4
+    DISTANCE_WEIGHT: float = 1.0
+    RATING_WEIGHT: float = 0.5
+    BOOKING_LOAD_WEIGHT: float = 0.25
+    MAX_RATING: float = 5.0
+    RECENT_BOOKING_DAYS: int = 30
+
+
+class BulkImportSettings(BaseSettings):
+    BULK_IMPORT_BATCH_SIZE: int = 500
+
+
+class AdminSettings(BaseSettings):
+    # Shared secret of the admin API, every admin-only route is refused when unset
+    ADMIN_API_KEY: Optional[str] = None
+
+
 class Config:
     env_file = "./.env"
 
 
 dbsettings = DBSettings()
 jwtsettings = JWTSettings()
+hashingsettings = HashingSettings()
+recommendationsettings = RecommendationSettings()
+bulkimportsettings = BulkImportSettings()
+adminsettings = AdminSettings()
@@ -1,13 +1,49 @@
-from sqlalchemy import create_engine
+from typing import Callable, Iterable, List, Optional, Tuple
+from fastapi import Request
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 from database.config import dbsettings
+from database.pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{dbsettings.POSTGRES_USER}:{dbsettings.POSTGRES_PASSWORD}@{dbsettings.POSTGRES_HOSTNAME}:{dbsettings.DATABASE_PORT}/{dbsettings.POSTGRES_DB}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=dbsettings.DB_POOL_SIZE,
+    max_overflow=dbsettings.DB_MAX_OVERFLOW,
+    pool_timeout=dbsettings.DB_POOL_TIMEOUT,
+    pool_recycle=dbsettings.DB_POOL_RECYCLE,
+    pool_pre_ping=dbsettings.DB_POOL_PRE_PING,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_SQLALCHEMY_DATABASE_URL = (
+    dbsettings.ASYNC_DATABASE_URL
+    or f"postgresql+asyncpg://{dbsettings.POSTGRES_USER}:{dbsettings.POSTGRES_PASSWORD}@{dbsettings.POSTGRES_HOSTNAME}:{dbsettings.DATABASE_PORT}/{dbsettings.POSTGRES_DB}"
+)
+
+if ASYNC_SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    # aiosqlite test databases use SQLAlchemy's default SQLite pooling
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+else:
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=dbsettings.DB_POOL_SIZE,
+        max_overflow=dbsettings.DB_MAX_OVERFLOW,
+        pool_timeout=dbsettings.DB_POOL_TIMEOUT,
+        pool_recycle=dbsettings.DB_POOL_RECYCLE,
+        pool_pre_ping=dbsettings.DB_POOL_PRE_PING,
+    )
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 Base = declarative_base()
 
@@ -18,3 +54,106 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db(request: Request):
+    # One session and one transaction per request: services flush, the
+    # UnitOfWorkRoute commits once the endpoint has returned. Anything raised
+    # before that leaves the transaction to roll back when the session closes
+    async with AsyncSessionLocal() as db:
+        request.state.db_session = db
+        yield db
+
+
+class UnitOfWorkRoute(APIRoute):
+    # Commits the request's session after the endpoint returns but before the
+    # response goes out, so a failed commit is reported instead of lost
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def unit_of_work_handler(request: Request):
+            response = await route_handler(request)
+            db = getattr(request.state, "db_session", None)
+            if db is not None and db.in_transaction():
+                await db.commit()
+            return response
+
+        return unit_of_work_handler
+
+
+def after_commit(db: AsyncSession, callback: Callable[[], None]) -> None:
+    # Runs callback once the session's outermost transaction commits and drops
+    # it on rollback. For in-process state (principal cache, spatial index)
+    # that must not get ahead of the database
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+def bump_version(obj) -> None:
+    # Increments the row's version_id in the UPDATE itself, so concurrent
+    # writers never end up on the same version; eager_defaults on the model
+    # reads the new value back with RETURNING
+    obj.version_id = type(obj).version_id + 1
+
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit(session: Session) -> None:
+    # also dispatched when a savepoint is released
+    if session.in_nested_transaction():
+        return
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("after_commit", None)
+
+
+def get_pool_stats():
+    pool_stats = {"sync": engine.pool.stats()}
+    if isinstance(async_engine.pool, InstrumentedQueuePool):
+        pool_stats["async"] = async_engine.pool.stats()
+    return pool_stats
+
+
+def get_unique_violation(
+    error: IntegrityError, columns: Iterable[str]
+) -> Optional[str]:
+    # Which of columns a unique constraint violation is about. Uses the
+    # constraint name when the driver exposes it (asyncpg, psycopg2), else the
+    # first line of the message ("UNIQUE constraint failed: owners.email")
+    constraint_name = getattr(error.orig.__cause__, "constraint_name", None)
+    if constraint_name is None and getattr(error.orig, "diag", None) is not None:
+        constraint_name = error.orig.diag.constraint_name
+    message = constraint_name or str(error.orig).splitlines()[0]
+    for column in columns:
+        if column in message:
+            return column
+    return None
+
+
+async def bulk_insert(
+    db: AsyncSession, model, rows: List[dict]
+) -> List[Tuple[int, IntegrityError]]:
+    # One executemany inside a savepoint. If any row violates a constraint the
+    # savepoint is rolled back and the rows are retried one savepoint each, so
+    # the good rows still go in; returns (row index, error) of the bad ones.
+    # The caller commits.
+    if not rows:
+        return []
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(model), rows)
+        return []
+    except IntegrityError:
+        pass
+
+    failures = []
+    for row_index, row in enumerate(rows):
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(model), [row])
+        except IntegrityError as error:
+            failures.append((row_index, error))
+    return failures
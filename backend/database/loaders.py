@@ -0,0 +1,17 @@
+"""
+Loader profiles, the relationship loading options list queries run with
+
+Every relationship on the models is lazy="raise", so serialising one that a
+query did not load fails loudly instead of firing a query per row. A profile
+names what its endpoints need: selectinload(...) adds one SELECT ... IN for
+the whole result, joinedload(...) folds a many-to-one into the same query,
+and raiseload("*") keeps everything else off.
+"""
+
+from sqlalchemy.orm import raiseload
+
+# Booking history pages serialise booking columns only
+BOOKING_LIST = (raiseload("*"),)
+
+# Owner pet lists serialise pet columns only
+PET_LIST = (raiseload("*"),)
@@ -1,10 +1,18 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Float, cast, delete, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Sequence, Tuple
 from models import models
+from database.config import dbsettings
+from database import loaders
+from database.db import after_commit, bulk_insert
+from utils import principal
 from datetime import datetime
+from functools import partial
 
 
-def create_owner(
-    db: Session,
+async def create_owner(
+    db: AsyncSession,
     unique_id: str,
     name: str,
     address: str,
@@ -14,39 +22,84 @@ def create_owner(
     lat: int,
     lon: int,
 ):
-    new_owner = models.Owner(
-        id=unique_id,
-        name=name,
-        address=address,
-        email=email,
-        password=password,
-        phone=phone,
-        lat=lat,
-        lon=lon,
-    )
-    db.add(new_owner)
-    db.commit()
-    db.refresh(new_owner)
+    # One INSERT ... RETURNING; duplicate email/phone surface as IntegrityError
+    # from the unique constraints, see db.get_unique_violation
+    try:
+        new_owner = await db.scalar(
+            insert(models.Owner)
+            .values(
+                id=unique_id,
+                name=name,
+                address=address,
+                email=email,
+                password=password,
+                phone=phone,
+                lat=lat,
+                lon=lon,
+            )
+            .returning(models.Owner)
+        )
+    except IntegrityError:
+        await db.rollback()
+        raise
     return new_owner
 
 
-def get_owner_by_id(db: Session, owner_id: str):
-    owner_obj = db.query(models.Owner).filter(models.Owner.id == owner_id).first()
+async def get_owner_by_id(db: AsyncSession, owner_id: str):
+    owner_obj = await db.scalar(
+        select(models.Owner).filter(models.Owner.id == owner_id)
+    )
     return owner_obj
 
 
-def get_owner_by_email(db: Session, owner_email: str):
-    owner_obj = db.query(models.Owner).filter(models.Owner.email == owner_email).first()
+async def get_owner_by_email(db: AsyncSession, owner_email: str):
+    owner_obj = await db.scalar(
+        select(models.Owner).filter(models.Owner.email == owner_email)
+    )
     return owner_obj
 
 
-def get_owner_by_phone(db: Session, owner_phone: str):
-    owner_obj = db.query(models.Owner).filter(models.Owner.phone == owner_phone).first()
+async def get_owner_credentials_by_email(db: AsyncSession, owner_email: str):
+    # Only the columns a login needs, as a plain row outside the identity map
+    owner_row = (
+        await db.execute(
+            select(models.Owner.id, models.Owner.name, models.Owner.password).filter(
+                models.Owner.email == owner_email
+            )
+        )
+    ).first()
+    return owner_row
+
+
+async def get_owner_by_phone(db: AsyncSession, owner_phone: str):
+    owner_obj = await db.scalar(
+        select(models.Owner).filter(models.Owner.phone == owner_phone)
+    )
     return owner_obj
 
 
-def edit_owner(
-    db: Session,
+async def get_owners_page(db: AsyncSession, after_id: Optional[str], limit: int):
+    # Keyset pagination on the primary key, no OFFSET scan
+    statement = select(models.Owner).order_by(models.Owner.id).limit(limit)
+    if after_id is not None:
+        statement = statement.where(models.Owner.id > after_id)
+    owner_objs = (await db.scalars(statement)).all()
+    return owner_objs
+
+
+async def stream_owners(db: AsyncSession):
+    # Server-side cursor fetched DB_STREAM_YIELD_PER rows at a time
+    owner_objs = await db.stream_scalars(
+        select(models.Owner)
+        .order_by(models.Owner.id)
+        .execution_options(yield_per=dbsettings.DB_STREAM_YIELD_PER)
+    )
+    async for owner_obj in owner_objs:
+        yield owner_obj
+
+
+async def edit_owner(
+    db: AsyncSession,
     owner_obj: models.Owner,
     address: str,
     email: str,
@@ -59,37 +112,52 @@ def edit_owner(
     owner_obj.phone = phone
     owner_obj.lat = lat
     owner_obj.lon = lon
-    db.commit()
-    db.refresh(owner_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_owner, owner_obj.id))
     return owner_obj
 
 
-def edit_owner_email(db: Session, owner_obj: models.Owner, email: str):
+async def edit_owner_email(db: AsyncSession, owner_obj: models.Owner, email: str):
     owner_obj.email = email
-    db.commit()
-    db.refresh(owner_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_owner, owner_obj.id))
     return owner_obj
 
 
-def edit_owner_phone(db: Session, owner_obj: models.Owner, phone: str):
+async def edit_owner_phone(db: AsyncSession, owner_obj: models.Owner, phone: str):
     owner_obj.phone = phone
-    db.commit()
-    db.refresh(owner_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_owner, owner_obj.id))
     return owner_obj
 
 
-def delete_owner(db: Session, owner_id: str):
-    owner_obj = db.query(models.Owner).filter(models.Owner.id == owner_id).first()
+async def edit_owner_password(db: AsyncSession, owner_id: str, password: str):
+    await db.execute(
+        update(models.Owner)
+        .where(models.Owner.id == owner_id)
+        .values(password=password)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def delete_owner(db: AsyncSession, owner_id: str):
+    owner_obj = await db.scalar(
+        select(models.Owner).filter(models.Owner.id == owner_id)
+    )
     if not owner_obj:
         return None
 
-    db.delete(owner_obj)
-    db.commit()
+    await db.execute(
+        delete(models.OwnerToken).where(models.OwnerToken.owner_id == owner_id)
+    )
+    await db.delete(owner_obj)
+    await db.flush()
+    after_commit(db, partial(principal.invalidate_owner, owner_id))
     return owner_obj
 
 
-def create_pet(
-    db: Session,
+async def create_pet(
+    db: AsyncSession,
     unique_id: str,
     name: str,
     age: int,
@@ -97,87 +165,171 @@ def create_pet(
     gender: str,
     owner_id: str,
 ):
-    new_pet = models.Pet(
-        id=unique_id,
-        name=name,
-        age=age,
-        breed=breed,
-        gender=gender,
-        owner_id=owner_id,
+    new_pet = await db.scalar(
+        insert(models.Pet)
+        .values(
+            id=unique_id,
+            name=name,
+            age=age,
+            breed=breed,
+            gender=gender,
+            owner_id=owner_id,
+        )
+        .returning(models.Pet)
     )
-    db.add(new_pet)
-    db.commit()
-    db.refresh(new_pet)
     return new_pet
 
 
-def get_pet_info(db: Session, pet_id: str):
-    pet_obj = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
+async def bulk_create_owners(db: AsyncSession, owners: List[dict]):
+    failures = await bulk_insert(db, models.Owner, owners)
+    return failures
+
+
+async def bulk_create_pets(db: AsyncSession, pets: List[dict]):
+    failures = await bulk_insert(db, models.Pet, pets)
+    return failures
+
+
+async def get_pet_info(db: AsyncSession, pet_id: str):
+    pet_obj = await db.scalar(select(models.Pet).filter(models.Pet.id == pet_id))
     return pet_obj
 
 
-def get_owner_pets(db: Session, owner_id: str):
-    pets_obj = db.query(models.Pet).filter(models.Pet.owner_id == owner_id).all()
+async def get_pet_version(db: AsyncSession, pet_id: str):
+    # Just the row version, enough to answer a conditional GET
+    version_id = await db.scalar(
+        select(models.Pet.version_id).filter(models.Pet.id == pet_id)
+    )
+    return version_id
+
+
+async def get_owner_pets(
+    db: AsyncSession, owner_id: str, options: Sequence = loaders.PET_LIST
+):
+    pets_obj = (
+        await db.scalars(
+            select(models.Pet).filter(models.Pet.owner_id == owner_id).options(*options)
+        )
+    ).all()
     return pets_obj
 
 
-def get_pet_owner_id(db: Session, pet_id: str):
-    pet_obj = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
+async def get_pet_owner_id(db: AsyncSession, pet_id: str):
+    pet_obj = await db.scalar(select(models.Pet).filter(models.Pet.id == pet_id))
     owner_id = pet_obj.owner_id
     return owner_id
 
 
-def create_booking(
-    db: Session,
+async def create_booking(
+    db: AsyncSession,
     unique_id: str,
     caretaker_id: str,
     owner_id: str,
     date_of_booking: datetime,
     instruction: str,
 ):
-    new_booking = models.Booking(
-        id=unique_id,
-        caretaker_id=caretaker_id,
-        owner_id=owner_id,
-        date_of_booking=date_of_booking,
-        instruction=instruction,
+    new_booking = await db.scalar(
+        insert(models.Booking)
+        .values(
+            id=unique_id,
+            caretaker_id=caretaker_id,
+            owner_id=owner_id,
+            date_of_booking=date_of_booking,
+            instruction=instruction,
+        )
+        .returning(models.Booking)
     )
-    db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
     return new_booking
 
 
-def get_owner_bookings(db: Session, owner_id: str):
-    booking_objs = (
-        db.query(models.Booking).filter(models.Booking.owner_id == owner_id).all()
+async def get_owner_bookings(
+    db: AsyncSession,
+    owner_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    limit: Optional[int] = None,
+    options: Sequence = loaders.BOOKING_LIST,
+):
+    # Newest first; after is the (date_of_booking, id) of the last row of the
+    # previous page. Served by ix_bookings_owner_id_date_of_booking
+    statement = (
+        select(models.Booking)
+        .filter(models.Booking.owner_id == owner_id)
+        .order_by(models.Booking.date_of_booking.desc(), models.Booking.id.desc())
+        .options(*options)
     )
+    if start is not None:
+        statement = statement.filter(models.Booking.date_of_booking >= start)
+    if end is not None:
+        statement = statement.filter(models.Booking.date_of_booking < end)
+    if after is not None:
+        statement = statement.filter(
+            tuple_(models.Booking.date_of_booking, models.Booking.id) < after
+        )
+    if limit is not None:
+        statement = statement.limit(limit)
+    booking_objs = (await db.scalars(statement)).all()
     return booking_objs
 
 
-def get_booking_info(db: Session, booking_id: str):
-    booking_obj = (
-        db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+async def get_booking_info(db: AsyncSession, booking_id: str):
+    booking_obj = await db.scalar(
+        select(models.Booking).filter(models.Booking.id == booking_id)
     )
     return booking_obj
 
 
-def create_review(
-    db: Session,
+async def get_booking_version(db: AsyncSession, booking_id: str):
+    version_id = await db.scalar(
+        select(models.Booking.version_id).filter(models.Booking.id == booking_id)
+    )
+    return version_id
+
+
+async def create_review(
+    db: AsyncSession,
     unique_id: str,
     booking_id: str,
     rating: int,
     date_of_review: datetime,
     comment: str,
 ):
-    new_review = models.Review(
-        id=unique_id,
-        booking_id=booking_id,
-        rating=rating,
-        date_of_review=date_of_review,
-        comment=comment,
+    new_review = await db.scalar(
+        insert(models.Review)
+        .values(
+            id=unique_id,
+            booking_id=booking_id,
+            rating=rating,
+            date_of_review=date_of_review,
+            comment=comment,
+        )
+        .returning(models.Review)
+    )
+    caretaker_id = (
+        select(models.Booking.caretaker_id)
+        .where(models.Booking.id == booking_id)
+        .scalar_subquery()
     )
-    db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    updated_caretaker_ids = (
+        await db.scalars(
+            update(models.Caretaker)
+            .where(models.Caretaker.id == caretaker_id)
+            .values(
+                {
+                    models.Caretaker.rating_sum: models.Caretaker.rating_sum + rating,
+                    models.Caretaker.rating_count: models.Caretaker.rating_count + 1,
+                    models.Caretaker.rating: cast(
+                        models.Caretaker.rating_sum + rating, Float
+                    )
+                    / (models.Caretaker.rating_count + 1),
+                    models.Caretaker.version_id: models.Caretaker.version_id + 1,
+                }
+            )
+            .returning(models.Caretaker.id)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    for updated_caretaker_id in updated_caretaker_ids:
+        after_commit(db, partial(principal.invalidate_caretaker, updated_caretaker_id))
     return new_review
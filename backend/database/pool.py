@@ -0,0 +1,80 @@
+"""
+Connection pool instrumentation
+"""
+
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that counts how often and how long callers had to wait for a
+    connection, and how often they gave up after pool_timeout.
+    """
+
+    # Blocking checkouts faster than this found a connection checked in already.
+    wait_threshold = 0.001
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def recreate(self):
+        # Pool.recreate() rebuilds the pool on dispose(); keep the counters.
+        new_pool = super().recreate()
+        new_pool.waits = self.waits
+        new_pool.wait_seconds = self.wait_seconds
+        new_pool.max_wait_seconds = self.max_wait_seconds
+        new_pool.timeouts = self.timeouts
+        return new_pool
+
+    def _do_get(self):
+        # Only a checkout with the overflow used up blocks on the queue, any
+        # other either takes an idle connection or opens a new one, and the
+        # time spent connecting is not a wait for the pool.
+        blocking = self._max_overflow > -1 and self._overflow >= self._max_overflow
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            if blocking and waited >= self.wait_threshold:
+                with self.stats_lock:
+                    self.waits += 1
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def stats(self) -> dict:
+        """
+            Live pool statistics
+        Returns:
+            dict: Pool size, usage and wait counters
+        """
+        with self.stats_lock:
+            return {
+                "size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 6),
+                "max_wait_seconds": round(self.max_wait_seconds, 6),
+                "timeouts": self.timeouts,
+            }
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """
+    InstrumentedQueuePool for asyncio engines.
+    """
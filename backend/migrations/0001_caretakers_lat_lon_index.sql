@@ -0,0 +1,2 @@
+-- Composite index used by the bounding-box prefilter of find_nearby_caretakers_sql
+CREATE INDEX IF NOT EXISTS ix_caretakers_lat_lon ON caretakers (lat, lon);
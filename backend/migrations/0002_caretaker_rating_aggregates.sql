@@ -0,0 +1,20 @@
+-- Running rating aggregates maintained by owner_service.create_review
+ALTER TABLE caretakers ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE caretakers ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill, same as caretaker_service.reconcile_caretaker_ratings
+UPDATE caretakers SET
+    rating_sum = stats.rating_sum,
+    rating_count = stats.rating_count,
+    rating = CASE WHEN stats.rating_count > 0
+        THEN stats.rating_sum::float / stats.rating_count ELSE 0 END
+FROM (
+    SELECT caretakers.id AS caretaker_id,
+           COALESCE(SUM(reviews.rating), 0) AS rating_sum,
+           COUNT(reviews.id) AS rating_count
+    FROM caretakers
+    LEFT JOIN bookings ON bookings.caretaker_id = caretakers.id
+    LEFT JOIN reviews ON reviews.booking_id = bookings.id
+    GROUP BY caretakers.id
+) AS stats
+WHERE caretakers.id = stats.caretaker_id;
@@ -0,0 +1,24 @@
+-- Issued token pairs, stored as sha256 digests, see authentication_service
+CREATE TABLE IF NOT EXISTS owner_tokens (
+    id VARCHAR PRIMARY KEY,
+    owner_id VARCHAR NOT NULL REFERENCES owners (id),
+    access_token VARCHAR NOT NULL UNIQUE,
+    access_token_expiry TIMESTAMP NOT NULL,
+    refresh_token VARCHAR NOT NULL UNIQUE,
+    refresh_token_expiry TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_owner_tokens_owner_id ON owner_tokens (owner_id);
+CREATE INDEX IF NOT EXISTS ix_owner_tokens_revoked_at ON owner_tokens (revoked_at);
+
+CREATE TABLE IF NOT EXISTS caretaker_tokens (
+    id VARCHAR PRIMARY KEY,
+    caretaker_id VARCHAR NOT NULL REFERENCES caretakers (id),
+    access_token VARCHAR NOT NULL UNIQUE,
+    access_token_expiry TIMESTAMP NOT NULL,
+    refresh_token VARCHAR NOT NULL UNIQUE,
+    refresh_token_expiry TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_caretaker_tokens_caretaker_id ON caretaker_tokens (caretaker_id);
+CREATE INDEX IF NOT EXISTS ix_caretaker_tokens_revoked_at ON caretaker_tokens (revoked_at);
@@ -0,0 +1,5 @@
+-- Booking history pages, see get_owner_bookings/get_caretaker_bookings
+CREATE INDEX IF NOT EXISTS ix_bookings_owner_id_date_of_booking
+    ON bookings (owner_id, date_of_booking);
+CREATE INDEX IF NOT EXISTS ix_bookings_caretaker_id_date_of_booking
+    ON bookings (caretaker_id, date_of_booking);
@@ -0,0 +1,4 @@
+-- Booking relationships use bookings.owner_id / bookings.caretaker_id directly.
+-- The association tables were never written to by create_booking.
+DROP TABLE IF EXISTS owner_booking_association;
+DROP TABLE IF EXISTS caretaker_booking_association;
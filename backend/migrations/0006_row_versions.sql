@@ -0,0 +1,4 @@
+-- Row versions behind the ETags of the caretaker, pet and booking detail routes
+ALTER TABLE caretakers ADD COLUMN IF NOT EXISTS version_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS version_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS version_id INTEGER NOT NULL DEFAULT 1;
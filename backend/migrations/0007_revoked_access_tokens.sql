@@ -0,0 +1,10 @@
+-- Access tokens superseded by a refresh, kept until they expire
+CREATE TABLE IF NOT EXISTS revoked_access_tokens (
+    access_token VARCHAR PRIMARY KEY,
+    access_token_expiry TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_revoked_access_tokens_access_token_expiry
+    ON revoked_access_tokens (access_token_expiry);
+CREATE INDEX IF NOT EXISTS ix_revoked_access_tokens_revoked_at
+    ON revoked_access_tokens (revoked_at);
@@ -0,0 +1,5 @@
+-- Expired token rows are deleted by the revoked token sync
+CREATE INDEX IF NOT EXISTS ix_owner_tokens_refresh_token_expiry
+    ON owner_tokens (refresh_token_expiry);
+CREATE INDEX IF NOT EXISTS ix_caretaker_tokens_refresh_token_expiry
+    ON caretaker_tokens (refresh_token_expiry);
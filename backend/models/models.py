@@ -1,22 +1,15 @@
 from database.db import Base
-from sqlalchemy import Column, String, Integer, DateTime, TEXT, ForeignKey, Table, Float
-from sqlalchemy.orm import relationship
-
-
-owner_booking = Table(
-    "owner_booking_association",
-    Base.metadata,
-    Column("owner_id", ForeignKey("owners.id")),
-    Column("booking_id", ForeignKey("bookings.id")),
-)
-
-
-caretaker_booking = Table(
-    "caretaker_booking_association",
-    Base.metadata,
-    Column("caretaker_id", ForeignKey("caretakers.id")),
-    Column("booking_id", ForeignKey("bookings.id")),
+from sqlalchemy import (
+    Column,
+    String,
+    Integer,
+    DateTime,
+    TEXT,
+    ForeignKey,
+    Float,
+    Index,
 )
+from sqlalchemy.orm import relationship
 
 
 class Owner(Base):
@@ -30,14 +23,15 @@ class Owner(Base):
     phone = Column(String, unique=True, nullable=False)
     lat = Column(Integer, nullable=False)
     lon = Column(Integer, nullable=False)
-    pet_obj = relationship("Pet", back_populates="owner_obj")
+    pet_obj = relationship("Pet", back_populates="owner_obj", lazy="raise")
     booking_obj = relationship(
-        "Booking", secondary=owner_booking, back_populates="owner_obj"
+        "Booking", back_populates="owner_obj", lazy="raise", passive_deletes="all"
     )
 
 
 class Pet(Base):
     __tablename__ = "pets"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(String, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
@@ -45,11 +39,15 @@ class Pet(Base):
     breed = Column(String)
     gender = Column(String)
     owner_id = Column(String, ForeignKey("owners.id"))
-    owner_obj = relationship("Owner", back_populates="pet_obj")
+    # row version behind the ETags, bumped in SQL on every change (db.bump_version)
+    version_id = Column(Integer, nullable=False, default=1, server_default="1")
+    owner_obj = relationship("Owner", back_populates="pet_obj", lazy="raise")
 
 
 class Caretaker(Base):
     __tablename__ = "caretakers"
+    __table_args__ = (Index("ix_caretakers_lat_lon", "lat", "lon"),)
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(String, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
@@ -60,26 +58,37 @@ class Caretaker(Base):
     lat = Column(Integer, nullable=False)
     lon = Column(Integer, nullable=False)
     rating = Column(Float, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    version_id = Column(Integer, nullable=False, default=1, server_default="1")
     booking_obj = relationship(
-        "Booking", secondary=caretaker_booking, back_populates="caretaker_obj"
+        "Booking", back_populates="caretaker_obj", lazy="raise", passive_deletes="all"
     )
 
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_owner_id_date_of_booking", "owner_id", "date_of_booking"),
+        Index(
+            "ix_bookings_caretaker_id_date_of_booking",
+            "caretaker_id",
+            "date_of_booking",
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(String, primary_key=True, nullable=False)
     caretaker_id = Column(String, ForeignKey("caretakers.id"))
     owner_id = Column(String, ForeignKey("owners.id"))
     date_of_booking = Column(DateTime, nullable=False)
     instruction = Column(String, nullable=True)
-    owner_obj = relationship(
-        "Owner", secondary=owner_booking, back_populates="booking_obj"
-    )
+    version_id = Column(Integer, nullable=False, default=1, server_default="1")
+    owner_obj = relationship("Owner", back_populates="booking_obj", lazy="raise")
     caretaker_obj = relationship(
-        "Caretaker", secondary=caretaker_booking, back_populates="booking_obj"
+        "Caretaker", back_populates="booking_obj", lazy="raise"
     )
-    review_obj = relationship("Review", back_populates="booking_obj")
+    review_obj = relationship("Review", back_populates="booking_obj", lazy="raise")
 
 
 class Review(Base):
@@ -90,4 +99,47 @@ class Review(Base):
     rating = Column(Integer, nullable=False)
     date_of_review = Column(DateTime, nullable=False)
     comment = Column(String, nullable=True)
-    booking_obj = relationship("Booking", back_populates="review_obj")
+    booking_obj = relationship("Booking", back_populates="review_obj", lazy="raise")
+
+
+class OwnerToken(Base):
+    __tablename__ = "owner_tokens"
+    __table_args__ = (
+        Index("ix_owner_tokens_revoked_at", "revoked_at"),
+        Index("ix_owner_tokens_refresh_token_expiry", "refresh_token_expiry"),
+    )
+
+    id = Column(String, primary_key=True, nullable=False)
+    owner_id = Column(String, ForeignKey("owners.id"), index=True, nullable=False)
+    access_token = Column(String, unique=True, nullable=False)
+    access_token_expiry = Column(DateTime, nullable=False)
+    refresh_token = Column(String, unique=True, nullable=False)
+    refresh_token_expiry = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class CaretakerToken(Base):
+    __tablename__ = "caretaker_tokens"
+    __table_args__ = (
+        Index("ix_caretaker_tokens_revoked_at", "revoked_at"),
+        Index("ix_caretaker_tokens_refresh_token_expiry", "refresh_token_expiry"),
+    )
+
+    id = Column(String, primary_key=True, nullable=False)
+    caretaker_id = Column(
+        String, ForeignKey("caretakers.id"), index=True, nullable=False
+    )
+    access_token = Column(String, unique=True, nullable=False)
+    access_token_expiry = Column(DateTime, nullable=False)
+    refresh_token = Column(String, unique=True, nullable=False)
+    refresh_token_expiry = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class RevokedAccessToken(Base):
+    # Access tokens superseded by a refresh, the token rows only hold the latest
+    __tablename__ = "revoked_access_tokens"
+
+    access_token = Column(String, primary_key=True, nullable=False)
+    access_token_expiry = Column(DateTime, index=True, nullable=False)
+    revoked_at = Column(DateTime, index=True, nullable=False)
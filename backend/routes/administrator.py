@@ -3,14 +3,37 @@ All api calls for admin
 """
 
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, status, Depends, HTTPException
+from typing import AsyncIterator, Dict, List, Literal, Optional
+import orjson
+from fastapi import APIRouter, status, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from schemas import owner, caretaker, administrator
 from sqlalchemy.orm import Session
-from database import db, admin_service
-from utils import hashing, token
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import (
+    db,
+    admin_service,
+    authentication_service,
+    caretaker_service,
+    owner_service,
+)
+from utils import bulk_import, hashing, oauth2, pagination, serializers, token
+
+router = APIRouter(route_class=db.UnitOfWorkRoute)
 
-router = APIRouter()
+
+async def ndjson_lines(objs: AsyncIterator, serializer: serializers.Serializer):
+    """
+        Serialise ORM objects one NDJSON line at a time
+    Args:
+        objs (AsyncIterator): ORM objects
+        serializer (serializers.Serializer): Serializer of the response schema
+
+    Yields:
+        bytes: One JSON line
+    """
+    async for obj in objs:
+        yield serializer.ndjson_line(obj)
 
 
 @router.post(
@@ -52,7 +75,7 @@ async def admin_signup(
         )
 
     unique_id = str(uuid.uuid4())
-    hashed_password = hashing.get_hashed_password(request.password)
+    hashed_password = await hashing.get_hashed_password_async(request.password)
     new_admin = admin_service.create_admin(
         db_session,
         unique_id,
@@ -77,13 +100,21 @@ async def admin_signup(
     "/owners", status_code=200, response_model=Optional[List[owner.ShowOwnerSchema]]
 )
 async def get_all_owners(
-    db_session: Session = Depends(db.get_db),
-) -> Optional[List[owner.ShowOwnerSchema]]:
-    """_summary_
-
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    db_session: AsyncSession = Depends(db.get_async_db),
+):
+    """
+        GET api call listing owners a page at a time, ordered by id. The next
+        page starts after the id in the X-Next-Cursor header, which is absent
+        on the last page. With stream=true every owner is sent as NDJSON
+        instead, read from a server-side cursor
     Args:
-        db_session (Session, optional): database session object
-        get_current_user (_type_, optional): current owner dependency object
+        cursor (Optional[str], optional): X-Next-Cursor of the previous page
+        limit (int, optional): Page size
+        stream (bool, optional): Stream every owner as NDJSON
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: No owners available
@@ -92,25 +123,278 @@ async def get_all_owners(
         List[owner.ShowOwnerSchema]: List of owner objects
     """
 
-    owner_objs = owner_service.get_all_owners(db_session)
-    if not owner_objs:
+    if stream:
+        return StreamingResponse(
+            ndjson_lines(
+                owner_service.stream_owners(db_session), serializers.owner_serializer
+            ),
+            media_type="application/x-ndjson",
+        )
+
+    owner_objs = await owner_service.get_owners_page(db_session, cursor, limit)
+    if not owner_objs and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No owners available !!!",
         )
-    return owner_objs
+    headers = {}
+    if len(owner_objs) == limit:
+        headers[pagination.NEXT_CURSOR_HEADER] = owner_objs[-1].id
+    return serializers.json_response(
+        serializers.owner_serializer.many(owner_objs), headers=headers
+    )
 
 
 @router.get(
     "/caretakers", status_code=200, response_model=List[caretaker.ShowCaretakerSchema]
 )
 async def get_all_caretakers(
-    db: Session = Depends(db.get_db),
-) -> List[caretaker.ShowCaretakerSchema]:
-    caretaker_objs = caretaker_service.get_all_caretakers(db)
-    if not caretaker_objs:
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    db_session: AsyncSession = Depends(db.get_async_db),
+):
+    """
+        GET api call listing caretakers a page at a time, ordered by id. The
+        next page starts after the id in the X-Next-Cursor header, which is
+        absent on the last page. With stream=true every caretaker is sent as
+        NDJSON instead, read from a server-side cursor
+    Args:
+        cursor (Optional[str], optional): X-Next-Cursor of the previous page
+        limit (int, optional): Page size
+        stream (bool, optional): Stream every caretaker as NDJSON
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: No caretakers available
+
+    Returns:
+        List[caretaker.ShowCaretakerSchema]: List of caretaker objects
+    """
+
+    if stream:
+        return StreamingResponse(
+            ndjson_lines(
+                caretaker_service.stream_caretakers(db_session),
+                serializers.caretaker_serializer,
+            ),
+            media_type="application/x-ndjson",
+        )
+
+    caretaker_objs = await caretaker_service.get_caretakers_page(
+        db_session, cursor, limit
+    )
+    if not caretaker_objs and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No caretakers available !!!",
         )
-    return caretaker_objs
+    headers = {}
+    if len(caretaker_objs) == limit:
+        headers[pagination.NEXT_CURSOR_HEADER] = caretaker_objs[-1].id
+    return serializers.json_response(
+        serializers.caretaker_serializer.many(caretaker_objs), headers=headers
+    )
+
+
+@router.post(
+    "/recommend", status_code=200, dependencies=[Depends(oauth2.require_admin)]
+)
+async def recommend_caretakers(
+    request: administrator.BulkRecommendSchema,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> StreamingResponse:
+    """
+        POST api call to recommend caretakers for many owners at once
+    Args:
+        request (administrator.BulkRecommendSchema): Owner ids, k and radius
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        StreamingResponse: One NDJSON line per owner, in request order
+    """
+
+    recommendations = caretaker_service.recommend_caretakers_for_owners(
+        db_session, request.owner_ids, request.k, request.radius
+    )
+
+    async def owner_recommendations():
+        async for owner_id, caretaker_objs in recommendations:
+            if caretaker_objs is None:
+                line = {
+                    "owner_id": owner_id,
+                    "caretakers": None,
+                    "detail": f"Owner with owner id: {owner_id} not found !!!",
+                }
+            else:
+                line = {
+                    "owner_id": owner_id,
+                    "caretakers": serializers.caretaker_serializer.many(caretaker_objs),
+                }
+            yield orjson.dumps(line) + b"\n"
+
+    return StreamingResponse(owner_recommendations(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/reconcile_ratings",
+    status_code=200,
+    response_model=int,
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def reconcile_caretaker_ratings(
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> int:
+    """
+        POST api call to rebuild the caretaker ratings that differ from the
+        reviews table
+    Args:
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        int: Number of caretakers updated
+    """
+
+    return await caretaker_service.reconcile_caretaker_ratings(db_session)
+
+
+@router.get(
+    "/pool",
+    status_code=200,
+    response_model=Dict[str, administrator.PoolStatsSchema],
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def get_pool_stats() -> Dict[str, administrator.PoolStatsSchema]:
+    """
+        GET api call for live database connection pool statistics
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        Dict[str, administrator.PoolStatsSchema]: Pool counters per engine
+    """
+
+    return {
+        engine_name: administrator.PoolStatsSchema(**pool_stats)
+        for engine_name, pool_stats in db.get_pool_stats().items()
+    }
+
+
+@router.get(
+    "/token_cache",
+    status_code=200,
+    response_model=administrator.CacheStatsSchema,
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def get_token_cache_stats() -> administrator.CacheStatsSchema:
+    """
+        GET api call for verified access token cache statistics
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        administrator.CacheStatsSchema: Cache size and hit/miss counters
+    """
+
+    return administrator.CacheStatsSchema(**token.verified_token_cache.stats())
+
+
+@router.post(
+    "/owner/{owner_id}/revoke_tokens",
+    status_code=200,
+    response_model=int,
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def revoke_owner_tokens(
+    owner_id: str,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> int:
+    """
+        POST api call to force logout an owner everywhere
+    Args:
+        owner_id (str): ID of the owner
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        int: Number of token pairs revoked
+    """
+
+    revoked = await authentication_service.revoke_owner_tokens(db_session, owner_id)
+    token.revoke_token_rows(revoked)
+    return len(revoked)
+
+
+@router.post(
+    "/caretaker/{caretaker_id}/revoke_tokens",
+    status_code=200,
+    response_model=int,
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def revoke_caretaker_tokens(
+    caretaker_id: str,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> int:
+    """
+        POST api call to force logout a caretaker everywhere
+    Args:
+        caretaker_id (str): ID of the caretaker
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        int: Number of token pairs revoked
+    """
+
+    revoked = await authentication_service.revoke_caretaker_tokens(
+        db_session, caretaker_id
+    )
+    token.revoke_token_rows(revoked)
+    return len(revoked)
+
+
+@router.post(
+    "/import/{kind}",
+    status_code=200,
+    response_model=administrator.BulkImportResultSchema,
+    dependencies=[Depends(oauth2.require_admin)],
+)
+async def bulk_import_records(
+    kind: Literal["owners", "caretakers", "pets"],
+    request: Request,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> administrator.BulkImportResultSchema:
+    """
+        POST api call to import owners, caretakers or pets in bulk. The body is
+        read as a stream, CSV with a header row when the content type is
+        text/csv and NDJSON otherwise
+    Args:
+        kind (str): owners, caretakers or pets
+        request (Request): Request with the records as its body
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Admin access required
+
+    Returns:
+        administrator.BulkImportResultSchema: Rows created and per-row errors
+    """
+
+    if "csv" in request.headers.get("content-type", ""):
+        records = bulk_import.parse_csv(request.stream())
+    else:
+        records = bulk_import.parse_ndjson(request.stream())
+    result = await bulk_import.import_records(db_session, kind, records)
+    return administrator.BulkImportResultSchema(**result)
@@ -2,15 +2,92 @@
 Apis related to owner and caretaker authentication
 """
 
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, status, Depends, HTTPException
+import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, BackgroundTasks, status, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from schemas import authentication
-from database import db, owner_service, caretaker_service
-from utils import token, hashing
+from database import db, owner_service, caretaker_service, authentication_service
+from utils import token, hashing, oauth2
 
 
-router = APIRouter()
+router = APIRouter(route_class=db.UnitOfWorkRoute)
+
+
+async def rehash_owner_password(owner_id: str, password: str) -> None:
+    """
+        Re-hash an owner password stored with outdated bcrypt parameters
+    Args:
+        owner_id (str): ID of the owner
+        password (str): Plain password that was just verified
+    """
+    hashed_password = await hashing.get_hashed_password_async(password)
+    async with db.AsyncSessionLocal.begin() as db_session:
+        await owner_service.edit_owner_password(db_session, owner_id, hashed_password)
+
+
+async def rehash_caretaker_password(caretaker_id: str, password: str) -> None:
+    """
+        Re-hash a caretaker password stored with outdated bcrypt parameters
+    Args:
+        caretaker_id (str): ID of the caretaker
+        password (str): Plain password that was just verified
+    """
+    hashed_password = await hashing.get_hashed_password_async(password)
+    async with db.AsyncSessionLocal.begin() as db_session:
+        await caretaker_service.edit_caretaker_password(
+            db_session, caretaker_id, hashed_password
+        )
+
+
+async def issue_owner_tokens(
+    db_session: AsyncSession, owner_id: str
+) -> token.TokenPair:
+    """
+        Create an owner token pair and persist its digests
+    Args:
+        db_session (AsyncSession): database session object
+        owner_id (str): ID of the owner
+
+    Returns:
+        token.TokenPair: Issued tokens
+    """
+    token_pair = token.create_token_pair(owner_id)
+    await authentication_service.store_owner_tokens(
+        db_session,
+        str(uuid.uuid4()),
+        owner_id,
+        token.token_digest(token_pair.access_token),
+        token_pair.access_token_expiry,
+        token.token_digest(token_pair.refresh_token),
+        token_pair.refresh_token_expiry,
+    )
+    return token_pair
+
+
+async def issue_caretaker_tokens(
+    db_session: AsyncSession, caretaker_id: str
+) -> token.TokenPair:
+    """
+        Create a caretaker token pair and persist its digests
+    Args:
+        db_session (AsyncSession): database session object
+        caretaker_id (str): ID of the caretaker
+
+    Returns:
+        token.TokenPair: Issued tokens
+    """
+    token_pair = token.create_token_pair(caretaker_id)
+    await authentication_service.store_caretaker_tokens(
+        db_session,
+        str(uuid.uuid4()),
+        caretaker_id,
+        token.token_digest(token_pair.access_token),
+        token_pair.access_token_expiry,
+        token.token_digest(token_pair.refresh_token),
+        token_pair.refresh_token_expiry,
+    )
+    return token_pair
 
 
 @router.post(
@@ -18,13 +95,15 @@ router = APIRouter()
 )
 async def owner_login(
     request: authentication.LoginSchema,
-    db_session: Session = Depends(db.get_db),
+    background_tasks: BackgroundTasks,
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> authentication.TokenSchema:
     """
         POST api call for owner login
     Args:
         request (authentication.LoginSchema): Request from client
-        db_session (Session, optional): database session object
+        background_tasks (BackgroundTasks): tasks run after the response
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -34,22 +113,26 @@ async def owner_login(
         authentication.TokenSchema: Token object
     """
 
-    owner_obj = owner_service.get_owner_by_email(db_session, request.username)
+    owner_obj = await owner_service.get_owner_credentials_by_email(
+        db_session, request.username
+    )
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
 
-    if not hashing.verify_password(request.password, owner_obj.password):
+    if not await hashing.verify_password_async(request.password, owner_obj.password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(owner_obj.password):
+        background_tasks.add_task(rehash_owner_password, owner_obj.id, request.password)
 
     owner_id, owner_name = owner_obj.id, owner_obj.name
-    access_token = token.create_access_token(owner_id)
-    refresh_token = token.create_refresh_token(owner_id)
+    token_pair = await issue_owner_tokens(db_session, owner_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {
         "name": owner_name,
         "id": owner_id,
@@ -67,13 +150,15 @@ async def owner_login(
 )
 async def caretaker_login(
     request: authentication.LoginSchema,
-    db_session: Session = Depends(db.get_db),
+    background_tasks: BackgroundTasks,
+    db_session: AsyncSession = Depends(db.get_async_db),
 ):
     """
         POST api call for caretaker login
     Args:
         request (authentication.LoginSchema): Request from client
-        db_session (Session, optional): database session object
+        background_tasks (BackgroundTasks): tasks run after the response
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -82,7 +167,7 @@ async def caretaker_login(
     Returns:
         authentication.TokenSchema: Token object
     """
-    caretaker_obj = caretaker_service.get_caretaker_by_email(
+    caretaker_obj = await caretaker_service.get_caretaker_credentials_by_email(
         db_session, request.username
     )
     if not caretaker_obj:
@@ -90,15 +175,21 @@ async def caretaker_login(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
-    if not hashing.verify_password(request.password, caretaker_obj.password):
+    if not await hashing.verify_password_async(
+        request.password, caretaker_obj.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(caretaker_obj.password):
+        background_tasks.add_task(
+            rehash_caretaker_password, caretaker_obj.id, request.password
+        )
 
     caretaker_id, caretaker_name = caretaker_obj.id, caretaker_obj.name
-    access_token = token.create_access_token(caretaker_id)
-    refresh_token = token.create_refresh_token(caretaker_id)
+    token_pair = await issue_caretaker_tokens(db_session, caretaker_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {
         "name": caretaker_name,
         "id": caretaker_obj.id,
@@ -115,14 +206,16 @@ async def caretaker_login(
     response_model=authentication.TokenSchema,
 )
 async def owner_refresh(
+    background_tasks: BackgroundTasks,
     request: OAuth2PasswordRequestForm = Depends(),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ):
     """
         POST api call for owner refresh
     Args:
+        background_tasks (BackgroundTasks): tasks run after the response
         request (OAuth2PasswordRequestForm, optional): dependency request.
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -131,21 +224,25 @@ async def owner_refresh(
     Returns:
         authentication.TokenSchema: Token object
     """
-    owner_obj = owner_service.get_owner_by_email(db_session, request.username)
+    owner_obj = await owner_service.get_owner_credentials_by_email(
+        db_session, request.username
+    )
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
-    if not hashing.verify_password(request.password, owner_obj.password):
+    if not await hashing.verify_password_async(request.password, owner_obj.password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(owner_obj.password):
+        background_tasks.add_task(rehash_owner_password, owner_obj.id, request.password)
 
     owner_id = owner_obj.id
-    access_token = token.create_access_token(owner_id)
-    refresh_token = token.create_refresh_token(owner_id)
+    token_pair = await issue_owner_tokens(db_session, owner_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {
         "name": owner_obj.name,
         "id": owner_obj.id,
@@ -161,14 +258,16 @@ async def owner_refresh(
     response_model=authentication.TokenSchema,
 )
 async def caretaker_refresh(
+    background_tasks: BackgroundTasks,
     request: OAuth2PasswordRequestForm = Depends(),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ):
     """
         POST api call for caretaker refresh
     Args:
+        background_tasks (BackgroundTasks): tasks run after the response
         request (OAuth2PasswordRequestForm, optional): dependency request.
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -177,7 +276,7 @@ async def caretaker_refresh(
     Returns:
         authentication.TokenSchema: Token object
     """
-    caretaker_obj = caretaker_service.get_caretaker_by_email(
+    caretaker_obj = await caretaker_service.get_caretaker_credentials_by_email(
         db_session, request.username
     )
     if not caretaker_obj:
@@ -185,15 +284,21 @@ async def caretaker_refresh(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
-    if not hashing.verify_password(request.password, caretaker_obj.password):
+    if not await hashing.verify_password_async(
+        request.password, caretaker_obj.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(caretaker_obj.password):
+        background_tasks.add_task(
+            rehash_caretaker_password, caretaker_obj.id, request.password
+        )
 
     caretaker_id = caretaker_obj.id
-    access_token = token.create_access_token(caretaker_id)
-    refresh_token = token.create_refresh_token(caretaker_id)
+    token_pair = await issue_caretaker_tokens(db_session, caretaker_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {
         "name": caretaker_obj.name,
         "id": caretaker_obj.id,
@@ -209,14 +314,16 @@ async def caretaker_refresh(
     response_model=authentication.TokenSchema,
 )
 async def swagger_owner_login(
+    background_tasks: BackgroundTasks,
     request: OAuth2PasswordRequestForm = Depends(),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> authentication.TokenSchema:
     """
         POST api call for owner login
     Args:
+        background_tasks (BackgroundTasks): tasks run after the response
         request (OAuth2PasswordRequestForm, optional): dependency request.
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -226,22 +333,26 @@ async def swagger_owner_login(
         authentication.TokenSchema: Token object
     """
 
-    owner_obj = owner_service.get_owner_by_email(db_session, request.username)
+    owner_obj = await owner_service.get_owner_credentials_by_email(
+        db_session, request.username
+    )
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
 
-    if not hashing.verify_password(request.password, owner_obj.password):
+    if not await hashing.verify_password_async(request.password, owner_obj.password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(owner_obj.password):
+        background_tasks.add_task(rehash_owner_password, owner_obj.id, request.password)
 
     owner_id = owner_obj.id
-    access_token = token.create_access_token(owner_id)
-    refresh_token = token.create_refresh_token(owner_id)
+    token_pair = await issue_owner_tokens(db_session, owner_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {"access_token": access_token, "refresh_token": refresh_token}
     return authentication.TokenSchema(**token_obj)
 
@@ -252,14 +363,16 @@ async def swagger_owner_login(
     response_model=authentication.TokenSchema,
 )
 async def swagger_caretaker_login(
+    background_tasks: BackgroundTasks,
     request: OAuth2PasswordRequestForm = Depends(),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ):
     """
         POST api call for caretaker login
     Args:
+        background_tasks (BackgroundTasks): tasks run after the response
         request (OAuth2PasswordRequestForm, optional): dependency request.
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Invalid credentials
@@ -268,7 +381,7 @@ async def swagger_caretaker_login(
     Returns:
         authentication.TokenSchema: Token object
     """
-    caretaker_obj = caretaker_service.get_caretaker_by_email(
+    caretaker_obj = await caretaker_service.get_caretaker_credentials_by_email(
         db_session, request.username
     )
     if not caretaker_obj:
@@ -276,14 +389,120 @@ async def swagger_caretaker_login(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
-    if not hashing.verify_password(request.password, caretaker_obj.password):
+    if not await hashing.verify_password_async(
+        request.password, caretaker_obj.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid credentials !!!",
         )
+    if hashing.needs_rehash(caretaker_obj.password):
+        background_tasks.add_task(
+            rehash_caretaker_password, caretaker_obj.id, request.password
+        )
 
     caretaker_id = caretaker_obj.id
-    access_token = token.create_access_token(caretaker_id)
-    refresh_token = token.create_refresh_token(caretaker_id)
+    token_pair = await issue_caretaker_tokens(db_session, caretaker_id)
+    access_token, refresh_token = token_pair.access_token, token_pair.refresh_token
     token_obj = {"access_token": access_token, "refresh_token": refresh_token}
     return authentication.TokenSchema(**token_obj)
+
+
+@router.post(
+    "/owner_token_refresh",
+    summary="Refresh owner access token",
+    response_model=authentication.AccessTokenSchema,
+)
+async def owner_token_refresh(
+    token_obj: dict = Depends(oauth2.refresh_current_owner),
+) -> authentication.AccessTokenSchema:
+    """
+        POST api call exchanging an owner refresh token for a new access token
+    Args:
+        token_obj (dict, optional): New access token for the refresh token sent
+
+    Returns:
+        authentication.AccessTokenSchema: Access token object
+    """
+    return authentication.AccessTokenSchema(**token_obj)
+
+
+@router.post(
+    "/caretaker_token_refresh",
+    summary="Refresh caretaker access token",
+    response_model=authentication.AccessTokenSchema,
+)
+async def caretaker_token_refresh(
+    token_obj: dict = Depends(oauth2.refresh_current_caretaker),
+) -> authentication.AccessTokenSchema:
+    """
+        POST api call exchanging a caretaker refresh token for a new access token
+    Args:
+        token_obj (dict, optional): New access token for the refresh token sent
+
+    Returns:
+        authentication.AccessTokenSchema: Access token object
+    """
+    return authentication.AccessTokenSchema(**token_obj)
+
+
+@router.post(
+    "/owner_signout", summary="Logout owner", status_code=status.HTTP_204_NO_CONTENT
+)
+async def owner_logout(
+    header: Request,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> None:
+    """
+        POST api call revoking the owner access token sent and its refresh token
+    Args:
+        header (Request): Request with the bearer access token
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Token not found
+    """
+    authorization = header.headers.get("authorization")
+    owner_id = token.authenticate_user(authorization)
+    access_token = authorization.split()[1]
+    revoked = await authentication_service.revoke_owner_tokens(
+        db_session, owner_id, token.token_digest(access_token)
+    )
+    if not revoked:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Token not found !!!",
+        )
+    token.revoke_token_rows(revoked)
+
+
+@router.post(
+    "/caretaker_signout",
+    summary="Logout caretaker",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def caretaker_logout(
+    header: Request,
+    db_session: AsyncSession = Depends(db.get_async_db),
+) -> None:
+    """
+        POST api call revoking the caretaker access token sent and its refresh token
+    Args:
+        header (Request): Request with the bearer access token
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Token not found
+    """
+    authorization = header.headers.get("authorization")
+    caretaker_id = token.authenticate_user(authorization)
+    access_token = authorization.split()[1]
+    revoked = await authentication_service.revoke_caretaker_tokens(
+        db_session, caretaker_id, token.token_digest(access_token)
+    )
+    if not revoked:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Token not found !!!",
+        )
+    token.revoke_token_rows(revoked)
@@ -1,12 +1,14 @@
 import uuid
-from fastapi import APIRouter, status, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, status, Depends, Header, HTTPException, Query
 from schemas import caretaker, booking
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import db, caretaker_service
-from typing import List
-from utils import oauth2, hashing
+from typing import List, Optional
+from utils import etag, oauth2, hashing, pagination, serializers
 
-router = APIRouter()
+router = APIRouter(route_class=db.UnitOfWorkRoute)
 
 
 @router.post(
@@ -16,13 +18,14 @@ router = APIRouter()
     response_model=caretaker.ShowCaretakerSchema,
 )
 async def caretaker_signup(
-    request: caretaker.CaretakerSchema, db_session: Session = Depends(db.get_db)
+    request: caretaker.CaretakerSchema,
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> caretaker.ShowCaretakerSchema:
     """
         POST api call for caretaker creation
     Args:
         request (caretaker.CaretakerSchema): Caretaker info
-        db_session (Session, optional): database session object.
+        db_session (AsyncSession, optional): database session object.
 
     Raises:
         HTTPException: If email already exists
@@ -32,40 +35,36 @@ async def caretaker_signup(
         caretaker.ShowCaretakerSchema: New caretaker object
     """
 
-    caretaker_email = request.email
-    caretaker_obj = caretaker_service.get_caretaker_by_email(
-        db_session, caretaker_email
-    )
-    if caretaker_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Email already exists !!!",
-        )
-    caretaker_phone = request.phone
-    caretaker_obj = caretaker_service.get_caretaker_by_phone(
-        db_session, caretaker_phone
-    )
-    if caretaker_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Phone number already exists !!!",
-        )
-
     unique_id = str(uuid.uuid4())
-    hashed_password = hashing.get_hashed_password(request.password)
-    new_caretaker = caretaker_service.create_caretaker(
-        db_session,
-        unique_id,
-        request.name,
-        request.address,
-        request.email,
-        hashed_password,
-        request.phone,
-        request.lat,
-        request.lon,
-        request.rating,
+    hashed_password = await hashing.get_hashed_password_async(request.password)
+    try:
+        new_caretaker = await caretaker_service.create_caretaker(
+            db_session,
+            unique_id,
+            request.name,
+            request.address,
+            request.email,
+            hashed_password,
+            request.phone,
+            request.lat,
+            request.lon,
+        )
+    except IntegrityError as error:
+        column = db.get_unique_violation(error, ("email", "phone"))
+        if column == "email":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Email already exists !!!",
+            )
+        if column == "phone":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Phone number already exists !!!",
+            )
+        raise
+    return serializers.json_response(
+        serializers.caretaker_serializer.one(new_caretaker), status.HTTP_201_CREATED
     )
-    return new_caretaker
 
 
 @router.get(
@@ -74,30 +73,42 @@ async def caretaker_signup(
     response_model=caretaker.ShowCaretakerSchema,
 )
 async def get_caretaker(
-    caretaker_id: str, db: Session = Depends(db.get_db)
+    caretaker_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(db.get_async_db),
 ) -> caretaker.ShowCaretakerSchema:
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db, caretaker_id)
+    if if_none_match:
+        version_id = await caretaker_service.get_caretaker_version(db, caretaker_id)
+        not_modified = etag.not_modified(if_none_match, caretaker_id, version_id)
+        if not_modified is not None:
+            return not_modified
+    caretaker_obj = await caretaker_service.get_caretaker_by_id(db, caretaker_id)
     if not caretaker_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Caretaker with caretaker id: {caretaker_id} not found !!!",
         )
-    return caretaker_obj
+    return serializers.json_response(
+        serializers.caretaker_serializer.one(caretaker_obj),
+        headers={
+            etag.ETAG_HEADER: etag.make_etag(caretaker_obj.id, caretaker_obj.version_id)
+        },
+    )
 
 
 @router.put("/{caretaker_id}", status_code=status.HTTP_202_ACCEPTED)
 async def edit_caretaker(
     caretaker_id: str,
     request: caretaker.UpdateCaretakerSchema,
-    db: Session = Depends(db.get_db),
+    db: AsyncSession = Depends(db.get_async_db),
 ):
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db, caretaker_id)
+    caretaker_obj = await caretaker_service.get_caretaker_by_id(db, caretaker_id)
     if not caretaker_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Caretaker with caretaker id: {caretaker_id} not found !!!",
         )
-    caretaker_obj = caretaker_service.edit_caretaker(
+    caretaker_obj = await caretaker_service.edit_caretaker(
         db,
         caretaker_obj,
         request.address,
@@ -110,8 +121,10 @@ async def edit_caretaker(
 
 
 @router.delete("/{caretaker_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_caretaker(caretaker_id: str, db: Session = Depends(db.get_db)) -> None:
-    caretaker_obj = caretaker_service.delete_caretaker(db, caretaker_id)
+async def delete_caretaker(
+    caretaker_id: str, db: AsyncSession = Depends(db.get_async_db)
+) -> None:
+    caretaker_obj = await caretaker_service.delete_caretaker(db, caretaker_id)
     if not caretaker_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -127,69 +140,81 @@ async def delete_caretaker(caretaker_id: str, db: Session = Depends(db.get_db))
     response_model=List[booking.ShowBookingSchema],
 )
 async def get_caretaker_bookings(
-    caretaker_id: str, db: Session = Depends(db.get_db)
+    caretaker_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(db.get_async_db),
 ) -> List[booking.ShowBookingSchema]:
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db, caretaker_id)
+    """
+        GET api call for a caretaker's booking history, newest first, optionally
+        limited to bookings made in [start, end). The next page starts after
+        the cursor in the X-Next-Cursor header, absent on the last page
+    Args:
+        caretaker_id (str): ID of the caretaker
+        start (Optional[datetime], optional): Earliest booking date
+        end (Optional[datetime], optional): Booking date upper bound, exclusive
+        cursor (Optional[str], optional): X-Next-Cursor of the previous page
+        limit (int, optional): Page size
+        db (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Caretaker not found
+        HTTPException: Caretaker has no bookings
+
+    Returns:
+        List[booking.ShowBookingSchema]: Page of bookings
+    """
+    caretaker_obj = await caretaker_service.get_caretaker_by_id(db, caretaker_id)
     if not caretaker_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Caretaker with caretaker id {caretaker_id} not found ...",
         )
-    booking_objs = caretaker_service.get_caretaker_bookings(db, caretaker_id)
-    if not booking_objs:
+    after = pagination.decode_cursor(cursor) if cursor is not None else None
+    booking_objs = await caretaker_service.get_caretaker_bookings(
+        db, caretaker_id, start, end, after, limit
+    )
+    if not booking_objs and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Caretaker with caretaker id {caretaker_id} has no bookings ...",
         )
-    return booking_objs
+    headers = {}
+    if len(booking_objs) == limit:
+        last_booking = booking_objs[-1]
+        headers[pagination.NEXT_CURSOR_HEADER] = pagination.encode_cursor(
+            last_booking.date_of_booking, last_booking.id
+        )
+    return serializers.json_response(
+        serializers.booking_serializer.many(booking_objs), headers=headers
+    )
 
 
 @router.get(
     "/booking/{booking_id}", status_code=200, response_model=booking.ShowBookingSchema
 )
 async def get_booking_info(
-    booking_id: str, db: Session = Depends(db.get_db)
+    booking_id: str, db: AsyncSession = Depends(db.get_async_db)
 ) -> booking.ShowBookingSchema:
-    booking_obj = caretaker_service.get_booking_info(db, booking_id)
+    booking_obj = await caretaker_service.get_booking_info(db, booking_id)
     if not booking_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Booking id {booking_id} not found ...",
         )
-    return booking_obj
+    return serializers.json_response(serializers.booking_serializer.one(booking_obj))
 
 
-@router.get("/rating/{caretaker_id}", status_code=200, response_model=int)
+@router.get("/rating/{caretaker_id}", status_code=200, response_model=float)
 async def get_caretaker_rating(
-    caretaker_id: str, db: Session = Depends(db.get_db)
-) -> int:
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db, caretaker_id)
+    caretaker_id: str, db: AsyncSession = Depends(db.get_async_db)
+) -> float:
+    caretaker_obj = await caretaker_service.get_caretaker_by_id(db, caretaker_id)
     if not caretaker_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Caretaker with caretaker id {caretaker_id} not found ...",
         )
-    caretaker_rating = caretaker_service.compute_caretaker_rating(db, caretaker_id)
-    return caretaker_rating
-
-
-@router.put(
-    "/rating/{caretaker_id}",
-    status_code=status.HTTP_202_ACCEPTED,
-    response_model=caretaker.UpdateCaretakerRatingSchema,
-)
-async def edit_caretaker_rating(
-    caretaker_id: str,
-    request: caretaker.UpdateCaretakerRatingSchema,
-    db: Session = Depends(db.get_db),
-) -> caretaker.ShowCaretakerSchema:
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db, caretaker_id)
-    if not caretaker_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Caretaker with caretaker id: {caretaker_id} not found !!!",
-        )
-    caretaker_obj = caretaker_service.edit_caretaker_rating(
-        db, caretaker_obj, request.rating
-    )
-    return caretaker_obj
+    return caretaker_obj.rating
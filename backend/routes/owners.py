@@ -5,13 +5,14 @@ All api calls for owners
 import uuid
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, status, Depends, HTTPException, Request
+from fastapi import APIRouter, status, Depends, Header, HTTPException, Query, Request
 from schemas import owner, pet, booking, caretaker
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import db, owner_service, caretaker_service
-from utils import hashing, token
+from utils import etag, hashing, oauth2, pagination, serializers, token
 
-router = APIRouter()
+router = APIRouter(route_class=db.UnitOfWorkRoute)
 
 
 @router.post(
@@ -21,13 +22,13 @@ router = APIRouter()
     response_model=owner.OwnerInfoSchema,
 )
 async def owner_signup(
-    request: owner.OwnerSchema, db_session: Session = Depends(db.get_db)
+    request: owner.OwnerSchema, db_session: AsyncSession = Depends(db.get_async_db)
 ) -> owner.OwnerInfoSchema:
     """
         POST api call for owner creation
     Args:
         request (owner.OwnerSchema): Owner info
-        db (Session, optional): Get db session
+        db (AsyncSession, optional): Get db session
 
     Raises:
         HTTPException: If email already exists
@@ -37,34 +38,33 @@ async def owner_signup(
         owner.OwnerInfoSchema: New owner object
     """
 
-    owner_email = request.email
-    owner_obj = owner_service.get_owner_by_email(db_session, owner_email)
-    if owner_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Email already exists !!!",
-        )
-    owner_phone = request.phone
-    owner_obj = owner_service.get_owner_by_phone(db_session, owner_phone)
-    if owner_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Phone number already exists !!!",
-        )
-
     unique_id = str(uuid.uuid4())
-    hashed_password = hashing.get_hashed_password(request.password)
-    new_owner = owner_service.create_owner(
-        db_session,
-        unique_id,
-        request.name,
-        request.address,
-        request.email,
-        hashed_password,
-        request.phone,
-        request.lat,
-        request.lon,
-    )
+    hashed_password = await hashing.get_hashed_password_async(request.password)
+    try:
+        new_owner = await owner_service.create_owner(
+            db_session,
+            unique_id,
+            request.name,
+            request.address,
+            request.email,
+            hashed_password,
+            request.phone,
+            request.lat,
+            request.lon,
+        )
+    except IntegrityError as error:
+        column = db.get_unique_violation(error, ("email", "phone"))
+        if column == "email":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Email already exists !!!",
+            )
+        if column == "phone":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Phone number already exists !!!",
+            )
+        raise
     new_owner_obj = {
         "name": new_owner.name,
         "address": new_owner.address,
@@ -76,14 +76,14 @@ async def owner_signup(
 
 @router.get("/{owner_id}", status_code=200, response_model=owner.ShowOwnerSchema)
 async def get_owner_by_id(
-    header: Request, owner_id: str, db_session: Session = Depends(db.get_db)
+    header: Request, owner_id: str, db_session: AsyncSession = Depends(db.get_async_db)
 ) -> owner.ShowOwnerSchema:
     """
         GET api call to get the owner corresponding to the provided owner_id
     Args:
         header (Request): Request headers
         owner_id (str): ID of the owner
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         HTTPException: Owner not found
@@ -98,22 +98,13 @@ async def get_owner_by_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await oauth2.get_owner_principal(header, db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id: {owner_id} not found !!!",
         )
-    owner_obj_dict = {
-        "id": owner_obj.id,
-        "name": owner_obj.name,
-        "email": owner_obj.email,
-        "phone": owner_obj.phone,
-        "address": owner_obj.address,
-        "lat": owner_obj.lat,
-        "lon": owner_obj.lon,
-    }
-    return owner.ShowOwnerSchema(**owner_obj_dict)
+    return serializers.json_response(serializers.owner_serializer.one(owner_obj))
 
 
 @router.put("/{owner_id}", status_code=status.HTTP_202_ACCEPTED)
@@ -121,7 +112,7 @@ async def edit_owner(
     header: Request,
     owner_id: str,
     request: owner.UpdateOwnerSchema,
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ):
     userid = token.authenticate_user(header.headers.get("authorization"))
     if userid != owner_id:
@@ -129,13 +120,13 @@ async def edit_owner(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await owner_service.get_owner_by_id(db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id: {owner_id} not found !!!",
         )
-    owner_obj = owner_service.edit_owner(
+    owner_obj = await owner_service.edit_owner(
         db_session,
         owner_obj,
         request.address,
@@ -149,7 +140,7 @@ async def edit_owner(
 
 @router.delete("/{owner_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_owner(
-    request: Request, owner_id: str, db_session: Session = Depends(db.get_db)
+    request: Request, owner_id: str, db_session: AsyncSession = Depends(db.get_async_db)
 ) -> None:
     userid = token.authenticate_user(request.headers.get("authorization"))
     if userid != owner_id:
@@ -157,7 +148,7 @@ async def delete_owner(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.delete_owner(db_session, owner_id)
+    owner_obj = await owner_service.delete_owner(db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -173,7 +164,7 @@ async def delete_owner(
 async def add_pet(
     header: Request,
     request: pet.PetSchema,
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> pet.ShowPetSchema:
     userid = token.authenticate_user(header.headers.get("authorization"))
     if userid != request.owner_id:
@@ -182,7 +173,7 @@ async def add_pet(
             detail="Invalid owner. Authentication failed !!!",
         )
     unique_id = str(uuid.uuid4())
-    new_pet = owner_service.create_pet(
+    new_pet = await owner_service.create_pet(
         db_session,
         unique_id,
         request.name,
@@ -191,7 +182,9 @@ async def add_pet(
         request.gender,
         request.owner_id,
     )
-    return new_pet
+    return serializers.json_response(
+        serializers.pet_serializer.one(new_pet), status.HTTP_201_CREATED
+    )
 
 
 @router.get(
@@ -202,7 +195,7 @@ async def add_pet(
 async def get_owner_pets(
     request: Request,
     owner_id: str,
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> Optional[List[pet.ShowPetSchema]]:
     userid = token.authenticate_user(request.headers.get("authorization"))
     if userid != owner_id:
@@ -210,27 +203,28 @@ async def get_owner_pets(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await oauth2.get_owner_principal(request, db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id: {owner_id} not found !!!",
         )
 
-    pets_obj = owner_service.get_owner_pets(db_session, owner_id)
+    pets_obj = await owner_service.get_owner_pets(db_session, owner_id)
     if not pets_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id: {owner_id} has not pets !!!",
         )
-    return pets_obj
+    return serializers.json_response(serializers.pet_serializer.many(pets_obj))
 
 
 @router.get("/pet/{pet_id}", status_code=200, response_model=pet.ShowPetSchema)
 async def get_pet_info(
     request: Request,
     pet_id: str,
-    db_session: Session = Depends(db.get_db),
+    if_none_match: Optional[str] = Header(None),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> pet.ShowPetSchema:
     userid = token.authenticate_user(request.headers.get("authorization"))
 
@@ -241,13 +235,21 @@ async def get_pet_info(
     #         status_code=status.HTTP_404_NOT_FOUND,
     #         detail=f"Invalid owner. Authentication failed !!!",
     #     )
-    pet_obj = owner_service.get_pet_info(db_session, pet_id)
+    if if_none_match:
+        version_id = await owner_service.get_pet_version(db_session, pet_id)
+        not_modified = etag.not_modified(if_none_match, pet_id, version_id)
+        if not_modified is not None:
+            return not_modified
+    pet_obj = await owner_service.get_pet_info(db_session, pet_id)
     if not pet_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Pet with pet id: {pet_id} not found !!!",
         )
-    return pet_obj
+    return serializers.json_response(
+        serializers.pet_serializer.one(pet_obj),
+        headers={etag.ETAG_HEADER: etag.make_etag(pet_obj.id, pet_obj.version_id)},
+    )
 
 
 # @router.get(
@@ -255,17 +257,17 @@ async def get_pet_info(
 # )
 # async def get_pet_owner(
 #     pet_id: str,
-#     db_session: Session = Depends(db.get_db),
+#     db_session: AsyncSession = Depends(db.get_async_db),
 # ):
-#     pet_obj = owner_service.get_pet_info(db_session, pet_id)
+#     pet_obj = await owner_service.get_pet_info(db_session, pet_id)
 #     if not pet_obj:
 #         raise HTTPException(
 #             status_code=status.HTTP_404_NOT_FOUND,
 #             detail=f"Pet with pet id: {pet_id} not found !!!",
 #         )
 
-#     owner_id = owner_service.get_pet_owner_id(db_session, pet_id)
-#     owner_obj = owner_service.get_owner(db_session, owner_id)
+#     owner_id = await owner_service.get_pet_owner_id(db_session, pet_id)
+#     owner_obj = await owner_service.get_owner(db_session, owner_id)
 #     return owner_obj
 
 
@@ -277,7 +279,7 @@ async def get_pet_info(
 async def create_booking(
     header: Request,
     request: booking.BookingSchema,
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> booking.ShowBookingSchema:
     print(header.headers.get("authorization"))
     userid = token.authenticate_user(header.headers.get("authorization"))
@@ -291,7 +293,7 @@ async def create_booking(
         )
     unique_id = str(uuid.uuid4())
     date_of_booking = datetime.utcnow()
-    new_booking = owner_service.create_booking(
+    new_booking = await owner_service.create_booking(
         db_session,
         unique_id,
         request.caretaker_id,
@@ -299,14 +301,9 @@ async def create_booking(
         date_of_booking,
         request.instruction,
     )
-    new_booking_obj = {
-        "id": unique_id,
-        "owner_id": request.owner_id,
-        "caretaker_id": request.caretaker_id,
-        "date_of_booking": date_of_booking,
-        "instruction": request.instruction,
-    }
-    return booking.ShowBookingSchema(**new_booking_obj)
+    return serializers.json_response(
+        serializers.booking_serializer.one(new_booking), status.HTTP_201_CREATED
+    )
 
 
 @router.get(
@@ -317,37 +314,63 @@ async def create_booking(
 async def get_owner_bookings(
     request: Request,
     owner_id: str,
-    db_session: Session = Depends(db.get_db),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> Optional[List[booking.ShowBookingSchema]]:
+    """
+        GET api call for an owner's booking history, newest first, optionally
+        limited to bookings made in [start, end). The next page starts after
+        the cursor in the X-Next-Cursor header, absent on the last page
+    Args:
+        request (Request): Request from the client
+        owner_id (str): ID of the owner
+        start (Optional[datetime], optional): Earliest booking date
+        end (Optional[datetime], optional): Booking date upper bound, exclusive
+        cursor (Optional[str], optional): X-Next-Cursor of the previous page
+        limit (int, optional): Page size
+        db_session (AsyncSession, optional): database session object
+
+    Raises:
+        HTTPException: Authentication failed
+        HTTPException: Owner not found
+        HTTPException: Owner has no bookings
+
+    Returns:
+        Optional[List[booking.ShowBookingSchema]]: Page of bookings
+    """
     userid = token.authenticate_user(request.headers.get("authorization"))
     if userid != owner_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await oauth2.get_owner_principal(request, db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id {owner_id} not found ...",
         )
-    booking_objs = owner_service.get_owner_bookings(db_session, owner_id)
-    if not booking_objs:
+    after = pagination.decode_cursor(cursor) if cursor is not None else None
+    booking_objs = await owner_service.get_owner_bookings(
+        db_session, owner_id, start, end, after, limit
+    )
+    if not booking_objs and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id {owner_id} has no bookings ...",
         )
-    owner_bookings = []
-    for booking_obj in booking_objs:
-        value = {
-            "id": booking_obj.id,
-            "caretaker_id": booking_obj.caretaker_id,
-            "owner_id": booking_obj.owner_id,
-            "date_of_booking": booking_obj.date_of_booking,
-            "instruction": booking_obj.instruction,
-        }
-        owner_bookings.append(booking.ShowBookingSchema(**value))
-    return owner_bookings
+    headers = {}
+    if len(booking_objs) == limit:
+        last_booking = booking_objs[-1]
+        headers[pagination.NEXT_CURSOR_HEADER] = pagination.encode_cursor(
+            last_booking.date_of_booking, last_booking.id
+        )
+    return serializers.json_response(
+        serializers.booking_serializer.many(booking_objs), headers=headers
+    )
 
 
 @router.get(
@@ -356,7 +379,8 @@ async def get_owner_bookings(
 async def get_booking_info(
     request: Request,
     booking_id: str,
-    db_session: Session = Depends(db.get_db),
+    if_none_match: Optional[str] = Header(None),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> booking.ShowBookingSchema:
     userid = token.authenticate_user(request.headers.get("authorization"))
 
@@ -368,20 +392,23 @@ async def get_booking_info(
     #         detail=f"Invalid owner. Authentication failed !!!",
     #     )
 
-    booking_obj = owner_service.get_booking_info(db_session, booking_id)
+    if if_none_match:
+        version_id = await owner_service.get_booking_version(db_session, booking_id)
+        not_modified = etag.not_modified(if_none_match, booking_id, version_id)
+        if not_modified is not None:
+            return not_modified
+    booking_obj = await owner_service.get_booking_info(db_session, booking_id)
     if not booking_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Booking id {booking_id} not found ...",
         )
-    value = {
-        "id": booking_obj.id,
-        "caretaker_id": booking_obj.caretaker_id,
-        "owner_id": booking_obj.owner_id,
-        "date_of_booking": booking_obj.date_of_booking,
-        "instruction": booking_obj.instruction,
-    }
-    return booking.ShowBookingSchema(**value)
+    return serializers.json_response(
+        serializers.booking_serializer.one(booking_obj),
+        headers={
+            etag.ETAG_HEADER: etag.make_etag(booking_obj.id, booking_obj.version_id)
+        },
+    )
 
 
 @router.post(
@@ -392,7 +419,7 @@ async def get_booking_info(
 async def create_review(
     header: Request,
     request: booking.ReviewSchema,
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> booking.ShowReviewSchema:
     userid = token.authenticate_user(header.headers.get("authorization"))
 
@@ -405,7 +432,7 @@ async def create_review(
     #     )
     unique_id = str(uuid.uuid4())
     date_of_review = datetime.utcnow()
-    new_review = owner_service.create_review(
+    new_review = await owner_service.create_review(
         db_session,
         unique_id,
         request.booking_id,
@@ -431,7 +458,12 @@ async def create_review(
 async def recommend_caretaker(
     request: Request,
     owner_id: str,
-    db_session: Session = Depends(db.get_db),
+    k: int = Query(5, ge=1, le=100),
+    radius: Optional[float] = Query(
+        None, gt=0, description="Search radius in kilometres"
+    ),
+    skip: int = Query(0, ge=0),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> Optional[List[caretaker.ShowCaretakerSchema]]:
     userid = token.authenticate_user(request.headers.get("authorization"))
     if userid != owner_id:
@@ -439,14 +471,14 @@ async def recommend_caretaker(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid owner. Authentication failed !!!",
         )
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await oauth2.get_owner_principal(request, db_session, owner_id)
     if not owner_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Owner with owner id: {owner_id} not found !!!",
         )
-    caretaker_objs = caretaker_service.find_nearby_caretakers(
-        db_session, owner_obj.lat, owner_obj.lon
+    caretaker_objs = await caretaker_service.find_nearby_caretakers(
+        db_session, owner_obj.lat, owner_obj.lon, k, radius, skip
     )
 
     if not caretaker_objs:
@@ -454,4 +486,6 @@ async def recommend_caretaker(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No caretakers nearby for Owner with owner id {owner_id} ...",
         )
-    return caretaker_objs
+    return serializers.json_response(
+        serializers.caretaker_serializer.many(caretaker_objs)
+    )
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field, confloat, conint, conlist
 
 
 class AdminSchema(BaseModel):
@@ -16,3 +17,40 @@ class AdminInfoSchema(BaseModel):
     address: str
     lat: int
     lon: int
+
+
+class BulkRecommendSchema(BaseModel):
+    owner_ids: conlist(str, max_items=1000)
+    k: conint(ge=1, le=100) = 5
+    radius: Optional[confloat(gt=0)] = Field(
+        None, description="Search radius in kilometres"
+    )
+
+
+class PoolStatsSchema(BaseModel):
+    size: int
+    max_overflow: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    waits: int
+    wait_seconds: float
+    max_wait_seconds: float
+    timeouts: int
+
+
+class CacheStatsSchema(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class BulkImportErrorSchema(BaseModel):
+    row: int
+    detail: str
+
+
+class BulkImportResultSchema(BaseModel):
+    created: int
+    errors: List[BulkImportErrorSchema]
@@ -23,6 +23,11 @@ class TokenSchema(BaseModel):
     refresh_token: str
 
 
+class AccessTokenSchema(BaseModel):
+    access_token: str
+    token_type: str
+
+
 class TokenPayloadSchema(BaseModel):
     sub: str
     exp: datetime
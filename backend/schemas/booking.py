@@ -15,7 +15,7 @@ class ShowBookingSchema(BaseModel):
     date_of_booking: datetime
     instruction: str
 
-    class config:
+    class Config:
         orm_mode = True
 
 
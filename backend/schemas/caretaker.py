@@ -9,7 +9,6 @@ class CaretakerSchema(BaseModel):
     phone: str
     lat: int
     lon: int
-    rating: float
 
 
 class ShowCaretakerSchema(BaseModel):
@@ -36,11 +35,3 @@ class UpdateCaretakerSchema(BaseModel):
 
     class Config:
         orm_mode = True
-
-
-class UpdateCaretakerRatingSchema(BaseModel):
-    id: str
-    rating: float
-
-    class Config:
-        orm_mode = True
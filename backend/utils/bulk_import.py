@@ -0,0 +1,240 @@
+"""
+Bulk import of owners, caretakers and pets from NDJSON or CSV
+
+Records are read as a stream, validated with the signup schemas and handled
+BULK_IMPORT_BATCH_SIZE at a time. Each batch hashes its passwords on the
+hashing worker pool, goes in as one executemany and is committed. Rows that
+fail validation or a constraint are reported back without aborting the rest.
+
+Also usable from the command line, from the backend directory:
+    python -m utils.bulk_import caretakers kennels.csv
+    python -m utils.bulk_import pets pets.ndjson
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import uuid
+from typing import AsyncIterator, Dict, List, Tuple
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import db, owner_service, caretaker_service
+from database.config import bulkimportsettings
+from schemas import owner, caretaker, pet
+from utils import hashing
+
+IMPORT_SCHEMAS = {
+    "owners": owner.OwnerSchema,
+    "caretakers": caretaker.CaretakerSchema,
+    "pets": pet.PetSchema,
+}
+
+IMPORT_SERVICES = {
+    "owners": owner_service.bulk_create_owners,
+    "caretakers": caretaker_service.bulk_create_caretakers,
+    "pets": owner_service.bulk_create_pets,
+}
+
+UNIQUE_VIOLATIONS = {
+    "email": "Email already exists !!!",
+    "phone": "Phone number already exists !!!",
+}
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+        Split a stream of byte chunks into decoded lines
+    Args:
+        chunks (AsyncIterator[bytes]): Raw body chunks
+
+    Yields:
+        str: One line, without its line ending
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+async def parse_ndjson(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Tuple[int, object]]:
+    """
+        Parse NDJSON, one object per line
+    Args:
+        chunks (AsyncIterator[bytes]): Raw body chunks
+
+    Yields:
+        Tuple[int, object]: Line number and parsed record, or the
+            ValueError raised for a malformed line
+    """
+    row_number = 0
+    async for line in read_lines(chunks):
+        row_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as error:
+            yield row_number, error
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """
+        Parse CSV with a header row, quoted fields may span lines
+    Args:
+        chunks (AsyncIterator[bytes]): Raw body chunks
+
+    Yields:
+        Tuple[int, object]: Record number and a dict keyed by the header, or
+            the ValueError raised for a malformed record
+    """
+    header, pending, row_number = None, "", 0
+    async for line in read_lines(chunks):
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, ValueError(
+                f"Expected {len(header)} columns, got {len(values)}"
+            )
+            continue
+        yield row_number, dict(zip(header, values))
+    if pending:
+        yield row_number + 1, ValueError("Unterminated quoted field")
+
+
+def describe_failure(error) -> str:
+    """
+        Error message reported for a row
+    Args:
+        error (Exception): Parsing, validation or database error
+
+    Returns:
+        str: Message
+    """
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()
+        )
+    orig = getattr(error, "orig", None)
+    if orig is None:
+        return str(error)
+    column = db.get_unique_violation(error, UNIQUE_VIOLATIONS)
+    if column is not None:
+        return UNIQUE_VIOLATIONS[column]
+    return str(orig).splitlines()[0]
+
+
+async def import_batch(
+    db_session: AsyncSession, kind: str, batch: List[Tuple[int, object]]
+) -> Tuple[int, List[Dict]]:
+    """
+        Validate, hash and insert one batch of records
+    Args:
+        db_session (AsyncSession): database session object
+        kind (str): owners, caretakers or pets
+        batch (List[Tuple[int, object]]): Row numbers and parsed records
+
+    Returns:
+        Tuple[int, List[Dict]]: Rows created and per-row errors
+    """
+    errors, rows, row_numbers = [], [], []
+    for row_number, record in batch:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("Expected an object")
+            rows.append(IMPORT_SCHEMAS[kind](**record).dict())
+            row_numbers.append(row_number)
+        except (ValidationError, ValueError) as error:
+            errors.append({"row": row_number, "detail": describe_failure(error)})
+
+    if kind != "pets":
+        hashed_passwords = await asyncio.gather(
+            *(hashing.get_hashed_password_async(row["password"]) for row in rows)
+        )
+        for row, hashed_password in zip(rows, hashed_passwords):
+            row["password"] = hashed_password
+    for row in rows:
+        row["id"] = str(uuid.uuid4())
+
+    failures = await IMPORT_SERVICES[kind](db_session, rows)
+    # each batch is its own unit of work, a large import holds no long transaction
+    await db_session.commit()
+    for row_index, error in failures:
+        errors.append(
+            {"row": row_numbers[row_index], "detail": describe_failure(error)}
+        )
+    return len(rows) - len(failures), errors
+
+
+async def import_records(
+    db_session: AsyncSession,
+    kind: str,
+    records: AsyncIterator[Tuple[int, object]],
+) -> Dict:
+    """
+        Import a stream of parsed records batch by batch
+    Args:
+        db_session (AsyncSession): database session object
+        kind (str): owners, caretakers or pets
+        records (AsyncIterator[Tuple[int, object]]): parse_ndjson/parse_csv output
+
+    Returns:
+        Dict: Number of rows created and the per-row errors, ordered by row
+    """
+    created, errors, batch = 0, [], []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= bulkimportsettings.BULK_IMPORT_BATCH_SIZE:
+            batch_created, batch_errors = await import_batch(db_session, kind, batch)
+            created, batch = created + batch_created, []
+            errors.extend(batch_errors)
+    if batch:
+        batch_created, batch_errors = await import_batch(db_session, kind, batch)
+        created += batch_created
+        errors.extend(batch_errors)
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "errors": errors}
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as import_file:
+        while chunk := import_file.read(1 << 16):
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("kind", choices=sorted(IMPORT_SCHEMAS))
+    parser.add_argument("path", help=".csv file, anything else is read as NDJSON")
+    args = parser.parse_args()
+
+    parse = parse_csv if args.path.endswith(".csv") else parse_ndjson
+    async with db.AsyncSessionLocal() as db_session:
+        result = await import_records(
+            db_session, args.kind, parse(read_file(args.path))
+        )
+    for error in result["errors"]:
+        print(f"row {error['row']}: {error['detail']}", file=sys.stderr)
+    print(f"{result['created']} {args.kind} created, {len(result['errors'])} rejected")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Small in-process caches
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire at a given time.
+
+    Entries are evicted least recently used first once maxsize is reached,
+    and dropped on access once their expiry (a time.time() timestamp) passes.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+            Cached value for key, or None when missing or expired
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Optional[Any]: Cached value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+            Store a value
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+            expires_at (Optional[float], optional): Expiry timestamp, defaults to
+                now + ttl, or never when the cache has no ttl
+        """
+        if self.maxsize <= 0:
+            return
+        if expires_at is None:
+            expires_at = time.time() + self.ttl if self.ttl else float("inf")
+        if self.ttl:
+            expires_at = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+            Drop a key if cached
+        Args:
+            key (Hashable): Cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Drop every entry
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+            Cache size and hit/miss counters
+        Returns:
+            dict: size, maxsize, hits and misses
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,66 @@
+"""
+Strong ETags from row versions and If-None-Match handling
+"""
+
+from typing import Optional
+from fastapi import Response, status
+
+ETAG_HEADER = "ETag"
+
+
+def make_etag(row_id: str, version_id: int) -> str:
+    """
+        Strong ETag of a row's representation
+    Args:
+        row_id (str): ID of the row
+        version_id (int): version_id of the row
+
+    Returns:
+        str: Quoted entity tag
+    """
+    return f'"{row_id}.{version_id}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+        Whether an If-None-Match header matches etag. Uses the weak
+        comparison RFC 9110 asks for on If-None-Match, so a W/ prefix added
+        by a proxy still matches
+    Args:
+        if_none_match (Optional[str]): If-None-Match request header
+        etag (str): Current ETag of the resource
+
+    Returns:
+        bool: True when the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(
+    if_none_match: Optional[str], row_id: str, version_id: Optional[int]
+) -> Optional[Response]:
+    """
+        Empty 304 response when the client's copy of a row is current
+    Args:
+        if_none_match (Optional[str]): If-None-Match request header
+        row_id (str): ID of the row
+        version_id (Optional[int]): Current version_id, None if the row is gone
+
+    Returns:
+        Optional[Response]: 304 Not Modified, or None to serve the full response
+    """
+    if version_id is None:
+        return None
+    current_etag = make_etag(row_id, version_id)
+    if not etag_matches(if_none_match, current_etag):
+        return None
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={ETAG_HEADER: current_etag}
+    )
@@ -1,6 +1,57 @@
+import asyncio
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from database.config import hashingsettings
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def calibrate_bcrypt_rounds(
+    target_ms: float, min_rounds: int = 10, max_rounds: int = 16, samples: int = 5
+) -> int:
+    """
+        Pick the bcrypt cost whose verify time on this host is closest to the
+        target, from the median of several timed verifies. Run it once per
+        deployment target (benchmarks/bcrypt_calibration.py) and configure the
+        result as BCRYPT_ROUNDS
+    Args:
+        target_ms (float): Target verify latency in milliseconds
+        min_rounds (int, optional): Lowest cost to return
+        max_rounds (int, optional): Highest cost to return
+        samples (int, optional): Number of timed verifies
+
+    Returns:
+        int: bcrypt log2 rounds
+    """
+    sample_hash = bcrypt.using(rounds=min_rounds).hash("calibration")
+    timings_ms = []
+    for _ in range(max(1, samples)):
+        start = time.perf_counter()
+        bcrypt.verify("calibration", sample_hash)
+        timings_ms.append((time.perf_counter() - start) * 1000)
+    elapsed_ms = statistics.median(timings_ms)
+    # Every extra round doubles the work.
+    extra_rounds = round(math.log2(max(target_ms, 1e-3) / max(elapsed_ms, 1e-3)))
+    return max(min_rounds, min(max_rounds, min_rounds + extra_rounds))
+
+
+# Hashes below the configured cost are reported by needs_rehash and upgraded on
+# the next successful login, stronger hashes are left as they are.
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=hashingsettings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=hashingsettings.BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop while bounding how many hashes run at once.
+hashing_executor = ThreadPoolExecutor(
+    max_workers=hashingsettings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hashing",
+)
 
 
 def get_hashed_password(password: str) -> str:
@@ -9,3 +60,19 @@ def get_hashed_password(password: str) -> str:
 
 def verify_password(password: str, hashed_pass: str) -> bool:
     return password_context.verify(password, hashed_pass)
+
+
+def needs_rehash(hashed_pass: str) -> bool:
+    return password_context.needs_update(hashed_pass)
+
+
+async def get_hashed_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hashing_executor, get_hashed_password, password)
+
+
+async def verify_password_async(password: str, hashed_pass: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        hashing_executor, verify_password, password, hashed_pass
+    )
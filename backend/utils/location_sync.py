@@ -0,0 +1,48 @@
+"""
+Periodic reload of the in-process caretaker location structures
+"""
+
+import asyncio
+import logging
+from database import db, caretaker_service
+from database.config import recommendationsettings
+
+logger = logging.getLogger(__name__)
+
+
+async def sync_caretaker_locations() -> int:
+    """
+        Reload the caretaker spatial index or distance engine (whichever the
+        recommendation backend uses) from the caretakers table. The after_commit
+        hooks only update the process that wrote the rows, this picks up
+        caretakers added, moved or deleted by other workers and the bulk import
+        CLI, and anything a concurrent load missed
+    Returns:
+        int: Number of caretakers loaded, 0 for the sql backend
+    """
+
+    backend = recommendationsettings.RECOMMENDATION_BACKEND
+    if backend == "sql":
+        return 0
+    async with db.AsyncSessionLocal() as db_session:
+        caretaker_locations = await caretaker_service.get_caretaker_locations(
+            db_session
+        )
+    if backend == "vector":
+        caretaker_service.caretaker_engine.load(caretaker_locations)
+    else:
+        caretaker_service.caretaker_index.load(caretaker_locations)
+    return len(caretaker_locations)
+
+
+async def sync_caretaker_locations_forever() -> None:
+    """
+    Reload the caretaker locations every CARETAKER_LOCATION_SYNC_SECONDS
+    """
+
+    while True:
+        try:
+            await sync_caretaker_locations()
+        except Exception:
+            logger.exception("Caretaker location sync failed")
+        await asyncio.sleep(recommendationsettings.CARETAKER_LOCATION_SYNC_SECONDS)
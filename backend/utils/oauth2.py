@@ -2,15 +2,18 @@
 Authentication related methods
 """
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+import secrets
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from datetime import datetime
 from jose import jwt
-from database import db, owner_service, caretaker_service
+from database import db, owner_service, caretaker_service, authentication_service
 from schemas import owner, caretaker
-from database.config import jwtsettings
-from sqlalchemy.orm import Session
+from database.config import adminsettings, jwtsettings
+from sqlalchemy.ext.asyncio import AsyncSession
 from utils import token
+from utils.principal import principal_cache
 
 
 oauth2_owner_scheme = OAuth2PasswordBearer(
@@ -19,17 +22,109 @@ oauth2_owner_scheme = OAuth2PasswordBearer(
 oauth2_caretaker_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/v1/authentication/swagger_caretaker_login"
 )
+admin_key_scheme = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+
+def require_admin(admin_key: Optional[str] = Depends(admin_key_scheme)) -> None:
+    """
+        Dependency of the admin-only routes, checks the X-Admin-Key header
+        against ADMIN_API_KEY
+    Args:
+        admin_key (Optional[str], optional): X-Admin-Key header
+
+    Raises:
+        HTTPException: Missing or wrong admin key
+    """
+
+    expected_key = adminsettings.ADMIN_API_KEY
+    if (
+        not expected_key
+        or not admin_key
+        or not secrets.compare_digest(admin_key.encode(), expected_key.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required !!!",
+        )
+
+
+def _request_principals(request: Request) -> dict:
+    if not hasattr(request.state, "principals"):
+        request.state.principals = {}
+    return request.state.principals
+
+
+async def get_owner_principal(
+    request: Request, db_session: AsyncSession, owner_id: str
+) -> Optional[owner.ShowOwnerSchema]:
+    """
+        Resolve an owner at most once per request, backed by the shared cache
+    Args:
+        request (Request): Current request
+        db_session (AsyncSession): database session object
+        owner_id (str): ID of the owner
+
+    Returns:
+        Optional[owner.ShowOwnerSchema]: Owner snapshot, None if not found
+    """
+
+    key = ("owner", owner_id)
+    request_principals = _request_principals(request)
+    if key in request_principals:
+        return request_principals[key]
+
+    owner_principal = principal_cache.get(key)
+    if owner_principal is None:
+        owner_obj = await owner_service.get_owner_by_id(db_session, owner_id)
+        if owner_obj is not None:
+            owner_principal = owner.ShowOwnerSchema.from_orm(owner_obj)
+            principal_cache.put(key, owner_principal)
+    request_principals[key] = owner_principal
+    return owner_principal
+
+
+async def get_caretaker_principal(
+    request: Request, db_session: AsyncSession, caretaker_id: str
+) -> Optional[caretaker.ShowCaretakerSchema]:
+    """
+        Resolve a caretaker at most once per request, backed by the shared cache
+    Args:
+        request (Request): Current request
+        db_session (AsyncSession): database session object
+        caretaker_id (str): ID of the caretaker
+
+    Returns:
+        Optional[caretaker.ShowCaretakerSchema]: Caretaker snapshot, None if not found
+    """
+
+    key = ("caretaker", caretaker_id)
+    request_principals = _request_principals(request)
+    if key in request_principals:
+        return request_principals[key]
+
+    caretaker_principal = principal_cache.get(key)
+    if caretaker_principal is None:
+        caretaker_obj = await caretaker_service.get_caretaker_by_id(
+            db_session, caretaker_id
+        )
+        if caretaker_obj is not None:
+            caretaker_principal = caretaker.ShowCaretakerSchema.from_orm(caretaker_obj)
+            principal_cache.put(key, caretaker_principal)
+    request_principals[key] = caretaker_principal
+    return caretaker_principal
 
 
 async def get_current_owner(
+    request: Request,
     token_data: str = Depends(oauth2_owner_scheme),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> owner.ShowOwnerSchema:
     """
         Validate the current owner
     Args:
+        request (Request): Current request
         token_data (str, optional): token passed from the client
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         credentials_exception: Invalid credentials
@@ -45,6 +140,7 @@ async def get_current_owner(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    token.ensure_not_revoked(token_data)
     payload = jwt.decode(
         token_data,
         jwtsettings.JWT_SECRET_KEY,
@@ -62,7 +158,7 @@ async def get_current_owner(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    owner_obj = owner_service.get_owner_by_id(db_session, owner_id)
+    owner_obj = await get_owner_principal(request, db_session, owner_id)
     if owner_obj is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -73,14 +169,16 @@ async def get_current_owner(
 
 
 async def get_current_caretaker(
+    request: Request,
     token_data: str = Depends(oauth2_owner_scheme),
-    db_session: Session = Depends(db.get_db),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> caretaker.ShowCaretakerSchema:
     """
         Validate the current caretaker
     Args:
+        request (Request): Current request
         token_data (str, optional): token passed from the client
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
         credentials_exception: Invalid credentials
@@ -96,6 +194,7 @@ async def get_current_caretaker(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    token.ensure_not_revoked(token_data)
     payload = jwt.decode(
         token_data,
         jwtsettings.JWT_SECRET_KEY,
@@ -113,7 +212,7 @@ async def get_current_caretaker(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    caretaker_obj = caretaker_service.get_caretaker_by_id(db_session, caretaker_id)
+    caretaker_obj = await get_caretaker_principal(request, db_session, caretaker_id)
     if caretaker_obj is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -125,19 +224,21 @@ async def get_current_caretaker(
 
 async def refresh_current_owner(
     token_data: str = Depends(oauth2_owner_scheme),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> dict:
     """
         Refresh the current owner token
     Args:
         token_data (str, optional): token passed from the client
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
+        HTTPException: Token revoked
         credentials_exception: Invalid credentials
         HTTPException: Token expired
 
     Returns:
-        authentication.TokenSchema: Token object
+        dict: New access token
     """
 
     credentials_exception = HTTPException(
@@ -146,6 +247,7 @@ async def refresh_current_owner(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    token.ensure_not_revoked(token_data)
     payload = jwt.decode(
         token_data,
         jwtsettings.JWT_REFRESH_SECRET_KEY,
@@ -163,26 +265,51 @@ async def refresh_current_owner(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = token.create_access_token(owner_id)
-    token_obj = {"access_token": access_token}
-    return token_obj
+    token_obj = await authentication_service.get_owner_token_by_refresh_token(
+        db_session, token.token_digest(token_data)
+    )
+    if (token_obj is None) or (token_obj.owner_id != owner_id):
+        raise credentials_exception
+    if token_obj.revoked_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    if not token.token_expired(token_obj.access_token_expiry):
+        # the row is about to hold the new access token, revoke the one it replaces
+        await authentication_service.revoke_access_token(
+            db_session, token_obj.access_token, token_obj.access_token_expiry
+        )
+        token.revoke_token(token_obj.access_token, token_obj.access_token_expiry)
+    token_pair = token.create_token_pair(owner_id)
+    await authentication_service.edit_owner_access_token(
+        db_session,
+        token_obj,
+        token.token_digest(token_pair.access_token),
+        token_pair.access_token_expiry,
+    )
+    return {"access_token": token_pair.access_token, "token_type": "bearer"}
 
 
 async def refresh_current_caretaker(
     token_data: str = Depends(oauth2_caretaker_scheme),
+    db_session: AsyncSession = Depends(db.get_async_db),
 ) -> dict:
     """
         Refresh the current caretaker token
     Args:
         token_data (str, optional): token passed from the client
-        db_session (Session, optional): database session object
+        db_session (AsyncSession, optional): database session object
 
     Raises:
+        HTTPException: Token revoked
         credentials_exception: Invalid credentials
         HTTPException: Token expired
 
     Returns:
-        authentication.TokenSchema: Token object
+        dict: New access token
     """
 
     credentials_exception = HTTPException(
@@ -191,6 +318,7 @@ async def refresh_current_caretaker(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    token.ensure_not_revoked(token_data)
     payload = jwt.decode(
         token_data,
         jwtsettings.JWT_REFRESH_SECRET_KEY,
@@ -208,6 +336,29 @@ async def refresh_current_caretaker(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = token.create_access_token(caretaker_id)
-    token_obj = {"access_token": access_token}
-    return token_obj
+    token_obj = await authentication_service.get_caretaker_token_by_refresh_token(
+        db_session, token.token_digest(token_data)
+    )
+    if (token_obj is None) or (token_obj.caretaker_id != caretaker_id):
+        raise credentials_exception
+    if token_obj.revoked_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    if not token.token_expired(token_obj.access_token_expiry):
+        # the row is about to hold the new access token, revoke the one it replaces
+        await authentication_service.revoke_access_token(
+            db_session, token_obj.access_token, token_obj.access_token_expiry
+        )
+        token.revoke_token(token_obj.access_token, token_obj.access_token_expiry)
+    token_pair = token.create_token_pair(caretaker_id)
+    await authentication_service.edit_caretaker_access_token(
+        db_session,
+        token_obj,
+        token.token_digest(token_pair.access_token),
+        token_pair.access_token_expiry,
+    )
+    return {"access_token": token_pair.access_token, "token_type": "bearer"}
@@ -0,0 +1,47 @@
+"""
+Keyset pagination cursors
+"""
+
+import base64
+from datetime import datetime
+from typing import Tuple
+from fastapi import HTTPException, status
+
+# Response header carrying the cursor of the next page, absent on the last one
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(date: datetime, row_id: str) -> str:
+    """
+        Opaque cursor for a (datetime, id) sort key
+    Args:
+        date (datetime): Datetime of the last row of the page
+        row_id (str): ID of the last row of the page
+
+    Returns:
+        str: URL safe cursor
+    """
+    key = f"{date.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+        Sort key encoded by encode_cursor
+    Args:
+        cursor (str): Cursor sent by the client
+
+    Raises:
+        HTTPException: Invalid cursor
+
+    Returns:
+        Tuple[datetime, str]: Datetime and id of the last row of the page
+    """
+    try:
+        date, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), row_id
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid cursor !!!",
+        )
@@ -0,0 +1,19 @@
+"""
+Shared cache of authenticated owners and caretakers
+"""
+
+from database.config import jwtsettings
+from utils.cache import TTLCache
+
+# ("owner" | "caretaker", id) -> ShowOwnerSchema / ShowCaretakerSchema snapshot
+principal_cache = TTLCache(
+    jwtsettings.PRINCIPAL_CACHE_SIZE, ttl=jwtsettings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_owner(owner_id: str) -> None:
+    principal_cache.invalidate(("owner", owner_id))
+
+
+def invalidate_caretaker(caretaker_id: str) -> None:
+    principal_cache.invalidate(("caretaker", caretaker_id))
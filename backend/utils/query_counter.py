@@ -0,0 +1,95 @@
+"""
+Count the SQL statements and round-trips an engine runs, to pin down query
+counts per endpoint
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class QueryCounter:
+    """
+    Records every statement sent to the engine while active.
+
+    An executemany counts as one statement, the same as one round-trip.
+    """
+
+    def __init__(self, engine):
+        if isinstance(engine, AsyncEngine):
+            engine = engine.sync_engine
+        self.engine: Engine = engine
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+class RoundTripCounter(QueryCounter):
+    """
+    Also records BEGIN, COMMIT and ROLLBACK, one round-trip each.
+
+    Closer to the network cost of a request than the statement count alone:
+    a commit-then-refresh write shows up as BEGIN, UPDATE, COMMIT, BEGIN,
+    SELECT where a flushed write inside one unit of work is UPDATE, COMMIT.
+    """
+
+    TRANSACTION_EVENTS = ("begin", "commit", "rollback")
+
+    def _transaction_event(self, name):
+        def record(conn):
+            self.statements.append(name.upper())
+
+        return record
+
+    def __enter__(self) -> "RoundTripCounter":
+        super().__enter__()
+        self._listeners = [
+            (name, self._transaction_event(name)) for name in self.TRANSACTION_EVENTS
+        ]
+        for name, listener in self._listeners:
+            event.listen(self.engine, name, listener)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for name, listener in self._listeners:
+            event.remove(self.engine, name, listener)
+        super().__exit__(*exc_info)
+
+
+@contextmanager
+def assert_query_count(engine, expected: int) -> Iterator[QueryCounter]:
+    """
+        Fail if the block runs a different number of statements than expected
+    Args:
+        engine (Engine | AsyncEngine): Engine the block talks to
+        expected (int): Expected number of statements
+
+    Raises:
+        AssertionError: With every statement run when the count differs
+
+    Yields:
+        QueryCounter: The active counter
+    """
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count != expected:
+        raise AssertionError(
+            f"Expected {expected} queries, got {counter.count}:\n"
+            + "\n".join(counter.statements)
+        )
@@ -1,2 +1,324 @@
+"""
+Distance computations used to recommend caretakers
+"""
+
+import math
+from typing import (
+    Callable,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
 def compute_distance(x1, y1, x2, y2):
-    return abs(x1 - y1) ** 2 + abs(x2 - y2) ** 2
+    return abs(x1 - x2) ** 2 + abs(y1 - y2) ** 2
+
+
+def compute_haversine_distance(lat1, lon1, lat2, lon2):
+    """
+        Great-circle distance between two points given in degrees
+    Args:
+        lat1 (float): Latitude of the first point
+        lon1 (float): Longitude of the first point
+        lat2 (float): Latitude of the second point
+        lon2 (float): Longitude of the second point
+
+    Returns:
+        float: Distance in kilometres
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def degree_extent(lat: float, radius_km: float) -> Tuple[float, float]:
+    """
+        Half sizes of the smallest latitude/longitude box holding every point
+        within radius_km of a point at latitude lat, used to turn a radius in
+        kilometres into bounds on coordinates stored in degrees
+    Args:
+        lat (float): Latitude of the centre
+        radius_km (float): Radius in kilometres
+
+    Returns:
+        Tuple[float, float]: Degrees of latitude and of longitude
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    if abs(lat) + d_lat >= 90:
+        # the circle reaches a pole, every longitude is in range
+        return d_lat, 180.0
+    d_lon = math.degrees(
+        math.asin(
+            min(
+                1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+            )
+        )
+    )
+    return d_lat, d_lon
+
+
+class DistanceEngine:
+    """
+    Keeps point coordinates in contiguous NumPy arrays and computes distances
+    from one or many query points to all of them in a single vectorized pass.
+
+    The "euclidean" metric matches compute_distance (squared distance in
+    coordinate units), "haversine" matches compute_haversine_distance
+    (kilometres, coordinates in degrees). A radius is always in kilometres,
+    whatever the metric used to rank the points.
+
+    batch_top_k works through the query points in chunks so the distance
+    matrices alive at once stay within memory_budget bytes.
+    """
+
+    METRICS = ("euclidean", "haversine")
+    # float64 (query point x stored point) matrices alive at the peak of
+    # batch_distances, counting the intermediates NumPy allocates
+    PEAK_MATRICES = {"euclidean": 3, "haversine": 6}
+
+    def __init__(self, metric: str = "euclidean", memory_budget: int = 32 * 2**20):
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown distance metric: {metric}")
+        self.metric = metric
+        self.memory_budget = memory_budget
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def clear(self) -> None:
+        """
+        Drop every point and mark the engine as not loaded
+        """
+        self.ids = np.empty(0, dtype=object)
+        self.lat = np.empty(0, dtype=np.float64)
+        self.lon = np.empty(0, dtype=np.float64)
+        self.loaded = False
+
+    def load(self, points: Iterable[Tuple[Hashable, float, float]]) -> None:
+        """
+            Replace the content of the engine
+        Args:
+            points (Iterable[Tuple[Hashable, float, float]]): (key, lat, lon) tuples
+        """
+        points = list(points)
+        self.ids = np.array([key for key, _, _ in points], dtype=object)
+        self.lat = np.ascontiguousarray([lat for _, lat, _ in points], np.float64)
+        self.lon = np.ascontiguousarray([lon for _, _, lon in points], np.float64)
+        self.loaded = True
+
+    def batch_distances(
+        self, lats: Sequence[float], lons: Sequence[float]
+    ) -> np.ndarray:
+        """
+            Distances from every query point to every stored point
+        Args:
+            lats (Sequence[float]): Latitudes of the query points
+            lons (Sequence[float]): Longitudes of the query points
+
+        Returns:
+            np.ndarray: Matrix of shape (len(lats), len(self))
+        """
+        q_lat = np.asarray(lats, dtype=np.float64)[:, np.newaxis]
+        q_lon = np.asarray(lons, dtype=np.float64)[:, np.newaxis]
+        if self.metric == "euclidean":
+            return (self.lat - q_lat) ** 2 + (self.lon - q_lon) ** 2
+        return self._haversine(q_lat, q_lon)
+
+    def _haversine(self, q_lat: np.ndarray, q_lon: np.ndarray) -> np.ndarray:
+        phi1, phi2 = np.radians(q_lat), np.radians(self.lat)
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(self.lon - q_lon)
+        a = (
+            np.sin(d_phi / 2) ** 2
+            + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    def rows_per_chunk(self) -> int:
+        """
+            Query points batch_top_k computes distances for at a time
+        Returns:
+            int: Largest chunk whose matrices fit in memory_budget, at least 1
+        """
+        row_bytes = len(self) * np.dtype(np.float64).itemsize
+        row_bytes *= self.PEAK_MATRICES[self.metric]
+        return max(1, self.memory_budget // max(row_bytes, 1))
+
+    def distances(self, lat: float, lon: float) -> np.ndarray:
+        """
+            Distances from one query point to every stored point
+        Args:
+            lat (float): Latitude of the query point
+            lon (float): Longitude of the query point
+
+        Returns:
+            np.ndarray: Vector of shape (len(self),)
+        """
+        return self.batch_distances([lat], [lon])[0]
+
+    def _select(
+        self,
+        distances: np.ndarray,
+        k: int,
+        radius: Optional[float],
+        lat: float,
+        lon: float,
+    ) -> List[Tuple[float, Hashable]]:
+        candidates = np.arange(len(distances))
+        if radius is not None:
+            km = distances
+            if self.metric == "euclidean":
+                km = self._haversine(np.array([[lat]]), np.array([[lon]]))[0]
+            candidates = candidates[km <= radius]
+        if k < len(candidates):
+            nearest = np.argpartition(distances[candidates], k - 1)[:k]
+            candidates = candidates[nearest]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(float(distances[i]), self.ids[i]) for i in candidates]
+
+    def top_k(
+        self, lat: float, lon: float, k: int, radius: Optional[float] = None
+    ) -> List[Tuple[float, Hashable]]:
+        """
+            The k stored points closest to (lat, lon)
+        Args:
+            lat (float): Latitude of the query point
+            lon (float): Longitude of the query point
+            k (int): Number of points to return
+            radius (Optional[float], optional): Ignore points further than this
+                many kilometres
+
+        Returns:
+            List[Tuple[float, Hashable]]: (distance, key) pairs, closest first
+        """
+        if k <= 0 or not len(self):
+            return []
+        return self._select(self.distances(lat, lon), k, radius, lat, lon)
+
+    def batch_top_k(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        k: int,
+        radius: Optional[float] = None,
+    ) -> List[List[Tuple[float, Hashable]]]:
+        """
+            The k stored points closest to each query point
+        Args:
+            lats (Sequence[float]): Latitudes of the query points
+            lons (Sequence[float]): Longitudes of the query points
+            k (int): Number of points to return per query point
+            radius (Optional[float], optional): Ignore points further than this
+                many kilometres
+
+        Returns:
+            List[List[Tuple[float, Hashable]]]: One top-k list per query point
+        """
+        if k <= 0 or not len(self):
+            return [[] for _ in lats]
+        nearest = []
+        rows = self.rows_per_chunk()
+        for start in range(0, len(lats), rows):
+            matrix = self.batch_distances(
+                lats[start : start + rows], lons[start : start + rows]
+            )
+            nearest.extend(
+                self._select(row, k, radius, lat, lon)
+                for row, lat, lon in zip(
+                    matrix, lats[start : start + rows], lons[start : start + rows]
+                )
+            )
+        return nearest
+
+
+class Candidate(NamedTuple):
+    key: Hashable
+    distance: float
+    rating: float
+    recent_bookings: int
+
+
+def distance_signal(candidates: Sequence[Candidate]) -> np.ndarray:
+    """
+    Distance scaled to [0, 1] relative to the furthest candidate
+    """
+    distances = np.array([c.distance for c in candidates], dtype=np.float64)
+    furthest = distances.max(initial=0.0)
+    return distances / furthest if furthest > 0 else np.zeros_like(distances)
+
+
+def rating_signal(
+    candidates: Sequence[Candidate], max_rating: float = 5.0
+) -> np.ndarray:
+    """
+    Missing rating points scaled to [0, 1], 0 for a perfect rating
+    """
+    ratings = np.array([c.rating or 0.0 for c in candidates], dtype=np.float64)
+    return 1.0 - np.clip(ratings / max_rating, 0.0, 1.0)
+
+
+def booking_load_signal(candidates: Sequence[Candidate]) -> np.ndarray:
+    """
+    Recent bookings scaled to [0, 1] relative to the busiest candidate
+    """
+    bookings = np.array([c.recent_bookings for c in candidates], dtype=np.float64)
+    busiest = bookings.max(initial=0.0)
+    return bookings / busiest if busiest > 0 else np.zeros_like(bookings)
+
+
+class ScoringPipeline:
+    """
+    Ranks a precomputed candidate set by a weighted sum of signals.
+
+    Every stage is a (weight, signal) pair where the signal maps the candidate
+    list to an array of penalties in [0, 1], lower being better. New ranking
+    signals are added as extra stages.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Tuple[float, Callable[[Sequence[Candidate]], np.ndarray]]],
+    ):
+        self.stages = [(weight, signal) for weight, signal in stages if weight]
+
+    def scores(self, candidates: Sequence[Candidate]) -> np.ndarray:
+        """
+            Combined penalty of every candidate
+        Args:
+            candidates (Sequence[Candidate]): Candidates to score
+
+        Returns:
+            np.ndarray: One score per candidate, lower is better
+        """
+        total = np.zeros(len(candidates), dtype=np.float64)
+        for weight, signal in self.stages:
+            total += weight * signal(candidates)
+        return total
+
+    def rank(self, candidates: Sequence[Candidate]) -> List[Candidate]:
+        """
+            Order candidates by score, ties keep their input order
+        Args:
+            candidates (Sequence[Candidate]): Candidates to rank
+
+        Returns:
+            List[Candidate]: Candidates, best first
+        """
+        if not candidates:
+            return []
+        order = np.argsort(self.scores(candidates), kind="stable")
+        return [candidates[i] for i in order]
@@ -0,0 +1,79 @@
+"""
+In-process set of revoked token digests
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+
+class RevocationSet:
+    """
+    Digests of revoked tokens, each kept until the token itself expires.
+
+    The owner_tokens/caretaker_tokens and revoked_access_tokens tables are
+    the source of truth, this set mirrors their revoked rows (bulk loaded by
+    the periodic sync) so every request can be checked without a database
+    round-trip. Expired digests are dropped lazily since an
+    expired token is rejected by the JWT check anyway.
+    """
+
+    def __init__(self):
+        self._expiry = {}
+        self._lock = threading.Lock()
+        self.synced_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def revoke(self, digest: str, expires_at: float) -> None:
+        """
+            Mark a token digest as revoked
+        Args:
+            digest (str): Token digest
+            expires_at (float): Token expiry timestamp
+        """
+        with self._lock:
+            self._expiry[digest] = max(expires_at, self._expiry.get(digest, 0))
+
+    def load(self, revoked: Iterable[Tuple[str, float]]) -> None:
+        """
+            Merge revoked (digest, expiry timestamp) pairs read from the database
+        Args:
+            revoked (Iterable[Tuple[str, float]]): Revoked digests
+        """
+        with self._lock:
+            for digest, expires_at in revoked:
+                self._expiry[digest] = max(expires_at, self._expiry.get(digest, 0))
+            now = time.time()
+            for digest in [d for d, exp in self._expiry.items() if exp <= now]:
+                del self._expiry[digest]
+
+    def is_revoked(self, digest: str) -> bool:
+        """
+            Check if a token digest has been revoked
+        Args:
+            digest (str): Token digest
+
+        Returns:
+            bool: True if the token was revoked and has not expired yet
+        """
+        expires_at = self._expiry.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            with self._lock:
+                if self._expiry.get(digest, 0) <= time.time():
+                    self._expiry.pop(digest, None)
+                    return False
+            return True
+        return True
+
+    def clear(self) -> None:
+        """
+        Drop every digest
+        """
+        with self._lock:
+            self._expiry.clear()
+            self.synced_at = None
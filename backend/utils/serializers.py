@@ -0,0 +1,62 @@
+"""
+Direct ORM-to-JSON serialization for the response schemas
+
+A handler that returns ORM objects or schema instances has them validated
+against its response_model and run through jsonable_encoder before the JSON
+is rendered, a second full pass over data the database already typed. A
+Serializer reads a schema's fields straight off the objects and json_response
+sends the result as an ORJSONResponse, which FastAPI passes through untouched.
+Routes keep their response_model for the OpenAPI docs.
+"""
+
+from operator import attrgetter
+from typing import Dict, Iterable, List, Mapping, Optional, Type
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from schemas import booking, caretaker, owner, pet
+
+
+class Serializer:
+    """
+    Builds the JSON-ready dict of a response schema from objects carrying its
+    fields as attributes: ORM rows, result rows or principal snapshots.
+    """
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.schema = schema
+        self.fields = tuple(schema.__fields__)
+        # a single attrgetter call fetches every field of a row
+        self.get_values = attrgetter(*self.fields)
+
+    def one(self, obj) -> Dict:
+        return dict(zip(self.fields, self.get_values(obj)))
+
+    def many(self, objs: Iterable) -> List[Dict]:
+        fields, get_values = self.fields, self.get_values
+        return [dict(zip(fields, get_values(obj))) for obj in objs]
+
+    def ndjson_line(self, obj) -> bytes:
+        return orjson.dumps(self.one(obj)) + b"\n"
+
+
+owner_serializer = Serializer(owner.ShowOwnerSchema)
+caretaker_serializer = Serializer(caretaker.ShowCaretakerSchema)
+pet_serializer = Serializer(pet.ShowPetSchema)
+booking_serializer = Serializer(booking.ShowBookingSchema)
+
+
+def json_response(
+    content, status_code: int = 200, headers: Optional[Mapping[str, str]] = None
+) -> ORJSONResponse:
+    """
+        Response FastAPI sends as is, skipping response_model validation
+    Args:
+        content (Any): Serializer output or other orjson serialisable data
+        status_code (int, optional): Status code, the route's own is not applied
+        headers (Optional[Mapping[str, str]], optional): Extra response headers
+
+    Returns:
+        ORJSONResponse: Rendered response
+    """
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
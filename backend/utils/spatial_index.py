@@ -0,0 +1,169 @@
+"""
+Grid based spatial index used for nearest neighbour lookups
+"""
+
+import heapq
+import math
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class GridIndex:
+    """
+    In-memory index that buckets points into square grid cells.
+
+    A k-nearest query visits the query cell and then rings of cells around it,
+    stopping as soon as no unvisited cell can hold a closer point, so only the
+    neighbourhood of the query point is scanned instead of every point.
+    """
+
+    def __init__(self, cell_size: float = 1.0):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = cell_size
+        self.loaded = False
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def load(self, points: Iterable[Tuple[Hashable, float, float]]) -> None:
+        """
+            Replace the content of the index
+        Args:
+            points (Iterable[Tuple[Hashable, float, float]]): (key, x, y) tuples
+        """
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            for key, x, y in points:
+                self._add(key, x, y)
+            self.loaded = True
+
+    def clear(self) -> None:
+        """
+        Drop every point and mark the index as not loaded
+        """
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self.loaded = False
+
+    def insert(self, key: Hashable, x: float, y: float) -> None:
+        """
+            Insert a point, moving it if the key is already indexed
+        Args:
+            key (Hashable): Point identifier
+            x (float): First coordinate
+            y (float): Second coordinate
+        """
+        with self._lock:
+            self._discard(key)
+            self._add(key, x, y)
+
+    def remove(self, key: Hashable) -> None:
+        """
+            Remove a point if it is indexed
+        Args:
+            key (Hashable): Point identifier
+        """
+        with self._lock:
+            self._discard(key)
+
+    def _add(self, key: Hashable, x: float, y: float) -> None:
+        self._points[key] = (x, y)
+        self._cells.setdefault(self._cell(x, y), {})[key] = (x, y)
+
+    def _discard(self, key: Hashable) -> None:
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def _ring(self, cx: int, cy: int, ring: int) -> Iterable[Tuple[int, int]]:
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for i in range(-ring, ring + 1):
+            yield (cx + i, cy - ring)
+            yield (cx + i, cy + ring)
+        for j in range(-ring + 1, ring):
+            yield (cx - ring, cy + j)
+            yield (cx + ring, cy + j)
+
+    def nearest(
+        self,
+        x: float,
+        y: float,
+        k: int,
+        radius: Optional[float] = None,
+        accept: Optional[Callable[[float, float], bool]] = None,
+    ) -> List[Tuple[float, Hashable]]:
+        """
+            Find the k points closest to (x, y)
+        Args:
+            x (float): First coordinate of the query point
+            y (float): Second coordinate of the query point
+            k (int): Number of points to return
+            radius (Optional[float], optional): Ignore points further than this,
+                in coordinate units
+            accept (Optional[Callable[[float, float], bool]], optional): Ignore
+                points for which this returns False, checked within radius
+
+        Returns:
+            List[Tuple[float, Hashable]]: (squared distance, key) pairs, closest first
+        """
+        with self._lock:
+            if k <= 0 or not self._points:
+                return []
+
+            best: List[Tuple[float, Hashable]] = []
+            limit = math.inf if radius is None else radius * radius
+
+            def consider(bucket):
+                for key, (px, py) in bucket.items():
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance > limit:
+                        continue
+                    if accept is not None and not accept(px, py):
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, key))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, key))
+
+            cx, cy = self._cell(x, y)
+            ring = 0
+            while True:
+                if 8 * ring >= len(self._cells):
+                    # The ring is larger than the set of occupied cells, so
+                    # scanning what is left directly is cheaper than walking it.
+                    for (bx, by), bucket in self._cells.items():
+                        if max(abs(bx - cx), abs(by - cy)) >= ring:
+                            consider(bucket)
+                    break
+
+                for cell in self._ring(cx, cy, ring):
+                    bucket = self._cells.get(cell)
+                    if bucket:
+                        consider(bucket)
+
+                # Every point outside the rings visited so far is at least
+                # ring * cell_size away from the query point.
+                reach = ring * self.cell_size
+                if reach * reach > limit:
+                    break
+                if len(best) == k and -best[0][0] <= reach * reach:
+                    break
+                ring += 1
+
+            return sorted((-distance, key) for distance, key in best)
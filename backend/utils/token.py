@@ -2,54 +2,214 @@
 Methods related to authentication tokens
 """
 
-from typing import Optional
+import asyncio
+import hashlib
+import logging
+import uuid
+from itertools import chain
+from calendar import timegm
+from typing import Iterable, NamedTuple, Optional
 from datetime import timedelta, datetime
 from fastapi import HTTPException, Header, status
 from jose import jwt, JWTError
+from database import db, authentication_service
 from database.config import jwtsettings
+from utils.cache import TTLCache
+from utils.revocation import RevocationSet
 
+# sha256(access token) -> verified "sub", kept until the token expires
+verified_token_cache = TTLCache(jwtsettings.TOKEN_CACHE_SIZE)
+# sha256 digests of logged out / force revoked access and refresh tokens
+revoked_tokens = RevocationSet()
 
-def create_access_token(user_id: str) -> str:
+logger = logging.getLogger(__name__)
+
+
+class TokenPair(NamedTuple):
+    access_token: str
+    access_token_expiry: datetime
+    refresh_token: str
+    refresh_token_expiry: datetime
+
+
+def create_access_token(user_id: str, expires_delta: Optional[datetime] = None) -> str:
     """
         Method for creating access token
     Args:
         user_id (str): User id
+        expires_delta (Optional[datetime], optional): Expiry, defaults to
+            ACCESS_TOKEN_EXPIRE_MINUTES from now
 
     Returns:
         str: Access token
     """
-    expires_delta = datetime.utcnow() + timedelta(
-        minutes=jwtsettings.ACCESS_TOKEN_EXPIRE_MINUTES
-    )
+    if expires_delta is None:
+        expires_delta = datetime.utcnow() + timedelta(
+            minutes=jwtsettings.ACCESS_TOKEN_EXPIRE_MINUTES
+        )
 
-    to_encode = {"exp": expires_delta, "sub": user_id}
+    to_encode = {"exp": expires_delta, "sub": user_id, "jti": uuid.uuid4().hex}
     encoded_jwt = jwt.encode(
         to_encode, jwtsettings.JWT_SECRET_KEY, jwtsettings.JWT_ALGORITHM
     )
     return encoded_jwt
 
 
-def create_refresh_token(user_id: str) -> str:
+def create_refresh_token(user_id: str, expires_delta: Optional[datetime] = None) -> str:
     """
         Method for creating refresh token
     Args:
         user_id (str): User id
+        expires_delta (Optional[datetime], optional): Expiry, defaults to
+            REFRESH_TOKEN_EXPIRE_MINUTES from now
 
     Returns:
         str: Refresh token
     """
 
-    expires_delta = datetime.utcnow() + timedelta(
-        minutes=jwtsettings.REFRESH_TOKEN_EXPIRE_MINUTES
-    )
+    if expires_delta is None:
+        expires_delta = datetime.utcnow() + timedelta(
+            minutes=jwtsettings.REFRESH_TOKEN_EXPIRE_MINUTES
+        )
 
-    to_encode = {"exp": expires_delta, "sub": user_id}
+    to_encode = {"exp": expires_delta, "sub": user_id, "jti": uuid.uuid4().hex}
     encoded_jwt = jwt.encode(
         to_encode, jwtsettings.JWT_REFRESH_SECRET_KEY, jwtsettings.JWT_ALGORITHM
     )
     return encoded_jwt
 
 
+def create_token_pair(user_id: str) -> TokenPair:
+    """
+        Create an access and refresh token along with their expiry
+    Args:
+        user_id (str): User id
+
+    Returns:
+        TokenPair: Tokens and their expiry datetimes (UTC, whole seconds)
+    """
+
+    now = datetime.utcnow().replace(microsecond=0)
+    access_token_expiry = now + timedelta(
+        minutes=jwtsettings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    refresh_token_expiry = now + timedelta(
+        minutes=jwtsettings.REFRESH_TOKEN_EXPIRE_MINUTES
+    )
+    return TokenPair(
+        create_access_token(user_id, access_token_expiry),
+        access_token_expiry,
+        create_refresh_token(user_id, refresh_token_expiry),
+        refresh_token_expiry,
+    )
+
+
+def token_digest(token: str) -> str:
+    """
+        Digest under which a token is persisted, cached and revoked
+    Args:
+        token (str): Encoded JWT
+
+    Returns:
+        str: Hex encoded sha256 of the token
+    """
+
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def revoke_token(digest: str, token_expiry: datetime) -> None:
+    """
+        Reject a token from now on, in this process
+    Args:
+        digest (str): Token digest
+        token_expiry (datetime): Token expiry (UTC)
+    """
+
+    revoked_tokens.revoke(digest, timegm(token_expiry.utctimetuple()))
+    verified_token_cache.invalidate(digest)
+
+
+def revoke_token_rows(revoked: Iterable[tuple]) -> None:
+    """
+        Reject the tokens of revoked token rows from now on, in this process
+    Args:
+        revoked (Iterable[tuple]): (access digest, access expiry, refresh digest,
+            refresh expiry) rows as returned by authentication_service
+    """
+
+    for access_digest, access_expiry, refresh_digest, refresh_expiry in revoked:
+        revoke_token(access_digest, access_expiry)
+        revoke_token(refresh_digest, refresh_expiry)
+
+
+async def sync_revoked_tokens() -> int:
+    """
+        Pull token rows revoked and access tokens superseded by a refresh since
+        the last sync (by any worker) into revoked_tokens, everything still
+        unexpired on the first call, and delete expired token rows
+    Returns:
+        int: Number of revoked rows read
+    """
+
+    started_at = datetime.utcnow()
+    revoked_since = None
+    if revoked_tokens.synced_at is not None:
+        # overlap with the previous window so rows committed late are not missed
+        revoked_since = revoked_tokens.synced_at - timedelta(
+            seconds=jwtsettings.REVOCATION_SYNC_SECONDS
+        )
+    async with db.AsyncSessionLocal.begin() as db_session:
+        revoked = await authentication_service.get_revoked_tokens(
+            db_session, revoked_since
+        )
+        superseded = await authentication_service.get_revoked_access_tokens(
+            db_session, revoked_since
+        )
+        await authentication_service.delete_expired_access_token_revocations(db_session)
+        await authentication_service.delete_expired_tokens(db_session)
+    # authenticate_user checks revoked_tokens before verified_token_cache, so
+    # a bulk load under one lock is enough, no cache entry needs invalidating
+    revoked_tokens.load(
+        (digest, timegm(expiry.utctimetuple()))
+        for digest, expiry in chain(
+            chain.from_iterable((row[:2], row[2:]) for row in revoked), superseded
+        )
+    )
+    revoked_tokens.synced_at = started_at
+    return len(revoked) + len(superseded)
+
+
+async def sync_revoked_tokens_forever() -> None:
+    """
+    Keep revoked_tokens in step with the token tables every REVOCATION_SYNC_SECONDS
+    """
+
+    while True:
+        try:
+            await sync_revoked_tokens()
+        except Exception:
+            logger.exception("Revoked token sync failed")
+        await asyncio.sleep(jwtsettings.REVOCATION_SYNC_SECONDS)
+
+
+def ensure_not_revoked(token: str) -> None:
+    """
+        Raise if a token has been revoked
+    Args:
+        token (str): Encoded JWT
+
+    Raises:
+        HTTPException: Token revoked
+    """
+
+    if revoked_tokens.is_revoked(token_digest(token)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
 def token_expired(token_expiry: datetime) -> bool:
     """
         Check if the access token is expired
@@ -84,9 +244,20 @@ def authenticate_user(headers: str) -> Optional[str]:
                 detail="Invalid token type. Bearer token required.",
             )
 
+        digest = token_digest(token)
+        if revoked_tokens.is_revoked(digest):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revoked.",
+            )
+        user_id = verified_token_cache.get(digest)
+        if user_id is not None:
+            return user_id
+
         payload = jwt.decode(
             token, jwtsettings.JWT_SECRET_KEY, jwtsettings.JWT_ALGORITHM
         )
+        verified_token_cache.put(digest, payload["sub"], payload.get("exp"))
         return payload["sub"]
     except (JWTError, ValueError):
         raise HTTPException(